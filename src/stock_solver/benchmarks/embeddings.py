@@ -0,0 +1,75 @@
+import time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from typing import Callable
+
+import torch
+
+from ..model.embeddings import DataEmbedding
+
+parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+parser.add_argument("--batch_size", type=int, default=64)
+parser.add_argument("--lookback", type=int, default=512)
+parser.add_argument("--features", type=int, default=5)
+parser.add_argument("--model_dim", type=int, default=128)
+parser.add_argument("--num_tickers", type=int, default=2000)
+parser.add_argument("--repeats", type=int, default=50)
+parser.add_argument("--threads", type=int, default=None, help="Number of intra-op CPU threads.")
+
+
+def reference_forward(
+    embedding: DataEmbedding, x: torch.Tensor, ticker_ids: torch.Tensor, x_marks: torch.Tensor
+) -> torch.Tensor:
+    """Unfused eval-mode computation: four [B, L, D] tensors, three temporal lookups and a transposed conv."""
+    L = x.size(1)
+    temporal = embedding.temporal_embedding
+    value = embedding.value_embedding.layer(x.transpose(1, 2)).transpose(1, 2)
+    ticker = embedding.ticker_embedding.embedding(ticker_ids.long()).unsqueeze(1).expand(-1, L, -1).contiguous()
+    marks = (
+        temporal.emb_month(x_marks[..., 0])
+        + temporal.emb_day(x_marks[..., 1])
+        + temporal.emb_weekday(x_marks[..., 2])
+    )
+    return embedding.positional_embedding(x) + value + ticker + marks
+
+
+def synthetic_inputs(batch_size: int, lookback: int, features: int, num_tickers: int):
+    x = torch.randn(batch_size, lookback, features)
+    ticker_ids = torch.randint(0, num_tickers, (batch_size,))
+    marks = torch.stack([
+        torch.randint(1, 13, (batch_size, lookback)),
+        torch.randint(1, 32, (batch_size, lookback)),
+        torch.randint(0, 7, (batch_size, lookback)),
+    ], dim=-1)
+    return x, ticker_ids, marks
+
+
+def time_it(fn: Callable[[], torch.Tensor], repeats: int) -> float:
+    fn()  # warm-up, also builds the fused temporal table
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - t0) / repeats
+
+
+@torch.no_grad()
+def max_difference(embedding: DataEmbedding, x: torch.Tensor, ticker_ids: torch.Tensor, marks: torch.Tensor) -> float:
+    """Largest deviation from the unfused computation, equivalence itself is tested in `test/test_embeddings.py`."""
+    embedding.eval()
+    return (embedding(x, ticker_ids, marks) - reference_forward(embedding, x, ticker_ids, marks)).abs().max().item()
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(42)
+
+    embedding = DataEmbedding(args.features, args.model_dim, args.num_tickers, 0.1, args.lookback).eval()
+    x, ticker_ids, marks = synthetic_inputs(args.batch_size, args.lookback, args.features, args.num_tickers)
+    max_diff = max_difference(embedding, x, ticker_ids, marks)
+
+    with torch.no_grad():
+        reference = time_it(lambda: reference_forward(embedding, x, ticker_ids, marks), args.repeats)
+        fused = time_it(lambda: embedding(x, ticker_ids, marks), args.repeats)
+    print(f"max |fused - reference|: {max_diff:.2e}")
+    print(f"reference: {reference * 1e3:.3f} ms | fused: {fused * 1e3:.3f} ms | speedup {reference / fused:.2f}x")
@@ -0,0 +1,86 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+
+# cumulative import time budget in milliseconds
+BUDGETS: Dict[str, float] = {
+    "src.stock_solver.metrics": 30,
+    "src.stock_solver.dataset.utils": 50,
+    "src.stock_solver.dataset.apis.alpaca": 60,
+    "src.stock_solver.dataset.apis.alpha_vantage": 400,
+    "src.stock_solver.dataset.apis.alpha_vantage_calls": 450,
+}
+# absolute milliseconds differ between machines, the budgets are scaled by the import time of a stdlib module
+# timed on the same machine, it took REFERENCE_MS where they were set
+REFERENCE_MODULE = "asyncio"
+REFERENCE_MS = 45.0
+# modules that must only be imported when they are actually used
+HEAVY_MODULES = ("numpy", "pandas", "joblib", "tqdm", "requests", "dotenv", "torch", "alpaca")
+CREDENTIALS = ("ALPHA_VANTAGE_API_KEY", "ALPACA_API_KEY", "ALPACA_SECRET_KEY")
+
+parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per module, the median is reported.")
+parser.add_argument("--scale", type=float, default=None,
+                    help=f"Multiplies every budget, by default measured from the import time of {REFERENCE_MODULE}.")
+
+
+def import_time(module: str, cwd: Path) -> Tuple[float, List[str]]:
+    """Cumulative import time of `module` in ms, and the heavy modules it pulled in."""
+    env = {k: v for k, v in os.environ.items() if k not in CREDENTIALS}
+    env["PYTHONPATH"] = os.pathsep.join([str(REPO_ROOT), env.get("PYTHONPATH", "")])
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{process.stderr[-2000:]}")
+    cumulative = 0.0
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = float(parts[1]) / 1000
+    heavy = [m for m in process.stdout.strip().split(",") if m]
+    return cumulative, heavy
+
+
+def median_import_time(module: str, cwd: Path, repeats: int) -> Tuple[float, List[str]]:
+    """Median over `repeats` fresh interpreters, and every heavy module any of them pulled in."""
+    runs = [import_time(module, cwd) for _ in range(repeats)]
+    return statistics.median(ms for ms, _ in runs), sorted({m for _, modules in runs for m in modules})
+
+
+def budget_scale(cwd: Path, repeats: int) -> float:
+    """How much slower than the machine the budgets were set on this one imports, never below 1."""
+    reference, _ = median_import_time(REFERENCE_MODULE, cwd, repeats)
+    return max(1.0, reference / REFERENCE_MS)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    failures: List[str] = []
+    # an empty working directory without a .env, importing must neither need credentials nor create files
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = Path(tmp)
+        scale = args.scale if args.scale is not None else budget_scale(cwd, args.repeats)
+        print(f"budgets scaled by {scale:.2f}")
+        for module, budget in BUDGETS.items():
+            median, heavy = median_import_time(module, cwd, args.repeats)
+            budget *= scale
+            status = "ok" if median <= budget and not heavy else "FAIL"
+            print(f"{status:4} {module:55} {median:8.1f} ms (budget {budget:.0f} ms) heavy: {heavy or '-'}")
+            if status != "ok":
+                failures.append(module)
+        created = sorted(p.name for p in cwd.iterdir())
+        if created:
+            print(f"FAIL importing created files: {created}")
+            failures.append("side effects")
+    sys.exit(1 if failures else 0)
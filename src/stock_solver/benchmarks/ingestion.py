@@ -0,0 +1,120 @@
+"""
+End-to-end ingestion benchmark against the local Alpha Vantage stand-in:
+`save_data` -> `load_data` -> `MultiTickerDataset` for a growing number of synthetic tickers.
+
+Every scale runs in a fresh interpreter inside an empty working directory, so the response cache,
+the log file and peak RSS are not shared between scales.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter, Namespace, SUPPRESS
+from pathlib import Path
+from typing import Any, Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+
+parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+parser.add_argument("--tickers", type=int, nargs="+", default=[10, 100, 1000], help="Number of synthetic tickers per run.")
+parser.add_argument("--days", type=int, default=250, help="Trading days of daily history per ticker.")
+parser.add_argument("--lookback", type=int, default=64)
+parser.add_argument("--horizon", type=int, default=5)
+parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every API response.")
+parser.add_argument("--throttle_rate", type=float, default=0.0, help="Probability of a Note/Information response.")
+parser.add_argument("--error_rate", type=float, default=0.0, help="Probability of a 503 response.")
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--output", type=Path, default=None, help="Writes the results as JSON to this file.")
+# internal, runs a single scale in the current process
+parser.add_argument("--run", type=int, default=None, help=SUPPRESS)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run(num_tickers: int, args: Namespace) -> Dict[str, Any]:
+    """Runs one scale in the current process and working directory."""
+    from ..dataset.apis import alpha_vantage_calls
+    from ..dataset.apis.alpha_vantage import cache
+    from ..dataset.apis.alpha_vantage.replay import Faults, SyntheticPayloads, serve
+    from ..dataset.dataset import MultiTickerDataset
+
+    # throttled and failed calls are retried immediately, the injected latency is what gets measured
+    alpha_vantage_calls.RETRY_WAIT = 0
+    # as `alpha_vantage_calls` runs by default, in this scale's working directory
+    cache.configure()
+    symbols = [f"SYN{i:04d}" for i in range(num_tickers)]
+    path = Path("dataset")
+    synthetic = SyntheticPayloads(days=args.days, seed=args.seed)
+    faults = Faults(args.latency, args.throttle_rate, args.error_rate, args.seed)
+
+    timings: Dict[str, float] = {}
+    with serve(synthetic=synthetic, faults=faults) as server:
+        t0 = time.perf_counter()
+        alpha_vantage_calls.save_data(symbols, path=path)
+        timings["save_data"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    data = alpha_vantage_calls.load_data(path)
+    timings["load_data"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    dataset = MultiTickerDataset(data, lookback=args.lookback, horizon=args.horizon)
+    timings["dataset"] = time.perf_counter() - t0
+
+    return {
+        "tickers": num_tickers,
+        "saved_tickers": len(data),
+        "windows": len(dataset),
+        "wall_seconds": sum(timings.values()),
+        "seconds": timings,
+        "api_calls": dict(server.stats.calls),
+        "api_calls_total": sum(server.stats.calls.values()),
+        "throttled": server.stats.throttled,
+        "server_errors": server.stats.errors,
+        "bytes_sent": server.stats.bytes_sent,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def spawn(num_tickers: int, args: Namespace) -> Dict[str, Any]:
+    argv = [
+        "--days", str(args.days), "--lookback", str(args.lookback), "--horizon", str(args.horizon),
+        "--latency", str(args.latency), "--throttle_rate", str(args.throttle_rate),
+        "--error_rate", str(args.error_rate), "--seed", str(args.seed), "--run", str(num_tickers),
+    ]
+    env = dict(os.environ, TQDM_DISABLE="1", ALPHA_VANTAGE_API_KEY="benchmark")
+    env["PYTHONPATH"] = os.pathsep.join([str(REPO_ROOT), env.get("PYTHONPATH", "")])
+    with tempfile.TemporaryDirectory() as tmp:
+        process = subprocess.run(
+            [sys.executable, "-m", "src.stock_solver.benchmarks.ingestion", *argv],
+            cwd=tmp, env=env, capture_output=True, text=True,
+        )
+    if process.returncode != 0:
+        raise RuntimeError(f"benchmark for {num_tickers} tickers failed:\n{process.stderr[-2000:]}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.run is not None:
+        print(json.dumps(run(args.run, args)))
+        sys.exit(0)
+
+    results: List[Dict[str, Any]] = []
+    for num_tickers in args.tickers:
+        result = spawn(num_tickers, args)
+        results.append(result)
+        print(
+            f"{num_tickers:6d} tickers: {result['wall_seconds']:8.2f}s "
+            f"(save {result['seconds']['save_data']:.2f}s, load {result['seconds']['load_data']:.2f}s, "
+            f"dataset {result['seconds']['dataset']:.2f}s) "
+            f"api calls {result['api_calls_total']} {result['api_calls']} "
+            f"peak rss {result['peak_rss_mb']:.0f} MB"
+        )
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
@@ -0,0 +1,224 @@
+"""
+Performance regression suite for the dataset, parsing and attention hot paths, on synthetic data.
+
+    python -m src.stock_solver.benchmarks.suite run --output baseline.json
+    python -m src.stock_solver.benchmarks.suite run --output current.json --compare baseline.json
+    python -m src.stock_solver.benchmarks.suite compare baseline.json current.json --threshold 0.15
+
+`compare` (and `run --compare`) exits with 1 when a case got slower than the baseline by more than the threshold.
+"""
+import json
+import platform
+import statistics
+import sys
+import time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import torch
+
+from ..dataset.apis.alpha_vantage.replay import SyntheticPayloads
+from ..dataset.apis.alpha_vantage_calls import aggregate_news_sentiment, parse_daily_OHLCV
+from ..dataset.dataset import DateAlignedDataset, MultiTickerDataset, collate
+from ..model.attentions import AttentionLayer
+from ..model.embeddings import DataEmbedding
+from .embeddings import synthetic_inputs
+
+Case = Callable[[], Callable[[], Any]]  # builds the inputs once, returns the timed function
+CASES: Dict[str, Case] = {}
+
+ATTENTION_LENGTHS = (96, 512, 2048)
+NUM_TICKERS = 200
+NUM_DAYS = 1000
+LOOKBACK = 96
+HORIZON = 3
+
+parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+commands = parser.add_subparsers(dest="command", required=True)
+run_parser = commands.add_parser("run", formatter_class=ArgumentDefaultsHelpFormatter, help="Runs the suite.")
+run_parser.add_argument("--output", type=Path, default=None, help="Stores the results as a JSON baseline.")
+run_parser.add_argument("--compare", type=Path, default=None, help="Baseline to compare the results against.")
+run_parser.add_argument("--filter", type=str, default=None, help="Only runs cases whose name contains this.")
+run_parser.add_argument("--repeats", type=int, default=7, help="Timed calls per case, the median is compared.")
+run_parser.add_argument("--threads", type=int, default=1, help="Intra-op CPU threads, fixed for comparable runs.")
+run_parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown.")
+compare_parser = commands.add_parser("compare", formatter_class=ArgumentDefaultsHelpFormatter,
+                                     help="Compares two stored results.")
+compare_parser.add_argument("baseline", type=Path)
+compare_parser.add_argument("current", type=Path)
+compare_parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown.")
+
+
+def case(name: str) -> Callable[[Case], Case]:
+    def register(setup: Case) -> Case:
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def synthetic_data(num_tickers: int = NUM_TICKERS, num_days: int = NUM_DAYS, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2018-01-01", periods=num_days, name="date")
+    data: Dict[str, pd.DataFrame] = {}
+    for i in range(num_tickers):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, num_days))).astype(np.float32)
+        data[f"T{i:04d}"] = pd.DataFrame({
+            "open": close, "high": close * 1.01, "low": close * 0.99, "close": close, "adjusted_close": close,
+            "volume": rng.integers(1, 1_000_000, num_days),
+            "news_sentiment_wmean": rng.random(num_days).astype(np.float32),
+        }, index=dates)
+    return data
+
+
+@case("dataset/construction")
+def dataset_construction() -> Callable[[], Any]:
+    data = synthetic_data()
+    return lambda: MultiTickerDataset(data, lookback=LOOKBACK, horizon=HORIZON)
+
+
+@case("dataset/getitem")
+def dataset_getitem() -> Callable[[], Any]:
+    dataset = MultiTickerDataset(synthetic_data(), lookback=LOOKBACK, horizon=HORIZON)
+    indices = np.random.default_rng(0).integers(0, len(dataset), 2000).tolist()
+    return lambda: [dataset[i] for i in indices]
+
+
+@case("dataset/batches")
+def dataset_batches() -> Callable[[], Any]:
+    dataset = MultiTickerDataset(synthetic_data(), lookback=LOOKBACK, horizon=HORIZON)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=64, shuffle=True, collate_fn=collate,
+                                         generator=torch.Generator().manual_seed(0))
+
+    def batches():
+        for i, batch in enumerate(loader):
+            if i == 50:
+                return batch
+    return batches
+
+
+@case("dataset/date_aligned_batches")
+def date_aligned_batches() -> Callable[[], Any]:
+    aligned = DateAlignedDataset(MultiTickerDataset(synthetic_data(), lookback=LOOKBACK, horizon=HORIZON))
+    return lambda: [aligned[i] for i in range(50)]
+
+
+@case("parsing/daily_ohlcv")
+def daily_ohlcv() -> Callable[[], Any]:
+    payload = SyntheticPayloads(days=5000, end=datetime(2024, 1, 1).date()).daily("SYN")
+    return lambda: parse_daily_OHLCV(payload)
+
+
+@case("parsing/aggregate_news_sentiment")
+def news_sentiment() -> Callable[[], Any]:
+    rng = np.random.default_rng(0)
+    published = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 4 * 365 * 24 * 3600, 50_000), unit="s")
+    raw = pd.DataFrame({
+        "relevance_score": rng.random(len(published)).astype(np.float32),
+        "ticker_sentiment_score": rng.uniform(-1, 1, len(published)).astype(np.float32),
+    }, index=published.strftime("%Y%m%dT%H%M%S"))
+    return lambda: aggregate_news_sentiment(raw)
+
+
+def attention_case(length: int) -> Case:
+    def setup() -> Callable[[], Any]:
+        torch.manual_seed(0)
+        layer = AttentionLayer(dim=128, heads=8, factor=5.0, attn_dropout=0.0, proj_dropout=0.0)
+        x = torch.randn(4, length, 128, requires_grad=True)
+
+        def forward_backward():
+            layer.zero_grad(set_to_none=True)
+            layer(x).sum().backward()
+        return forward_backward
+    return setup
+
+
+for _length in ATTENTION_LENGTHS:
+    case(f"model/attention_forward_backward_L{_length}")(attention_case(_length))
+
+
+@case("model/data_embedding")
+def data_embedding() -> Callable[[], Any]:
+    torch.manual_seed(0)
+    embedding = DataEmbedding(5, 128, 2000, 0.1, 512).eval()
+    x, ticker_ids, marks = synthetic_inputs(64, 512, 5, 2000)
+
+    def forward():
+        with torch.no_grad():
+            return embedding(x, ticker_ids, marks)
+    return forward
+
+
+def measure(setup: Case, repeats: int) -> Dict[str, float]:
+    fn = setup()
+    fn()  # warm-up: caches, lazy tables, allocator
+    times: List[float] = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"median": statistics.median(times), "min": min(times), "max": max(times), "repeats": repeats}
+
+
+def run(names: List[str], repeats: int) -> Dict[str, Any]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name in names:
+        results[name] = measure(CASES[name], repeats)
+        print(f"{name:45} {results[name]['median'] * 1e3:10.2f} ms (min {results[name]['min'] * 1e3:.2f} ms)")
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Prints the relative change of every case both runs have, returns the cases slower than `threshold`."""
+    regressions: List[str] = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{'new':10} {name}")
+            continue
+        ratio = result["median"] / before["median"]
+        status = "SLOWER" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else "ok"
+        print(f"{status:10} {name:45} {before['median'] * 1e3:10.2f} -> {result['median'] * 1e3:10.2f} ms ({ratio - 1:+.1%})")
+        if status == "SLOWER":
+            regressions.append(name)
+    if baseline["meta"].get("threads") != current["meta"].get("threads"):
+        print("note: the runs used a different number of threads")
+    return regressions
+
+
+def load(path: Path) -> Dict[str, Any]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    regressions: Optional[List[str]] = None
+    if args.command == "run":
+        torch.set_num_threads(args.threads)
+        names = [name for name in CASES if args.filter is None or args.filter in name]
+        current = run(names, args.repeats)
+        if args.output is not None:
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            args.output.write_text(json.dumps(current, indent=2), encoding="utf-8")
+        if args.compare is not None:
+            regressions = compare(load(args.compare), current, args.threshold)
+    else:
+        regressions = compare(load(args.baseline), load(args.current), args.threshold)
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
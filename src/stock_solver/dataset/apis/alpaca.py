@@ -1,15 +1,16 @@
-from typing import cast
+from typing import TYPE_CHECKING, cast
 
-from alpaca.trading import AssetClass, TradingClient, GetAssetsRequest, AssetStatus, Asset
+from src.stock_solver.dataset.utils import alpaca_keys
 
-from src.stock_solver.dataset.utils import api_keys
+if TYPE_CHECKING:
+    from alpaca.trading import Asset
 
-keys = api_keys()
-alpaca_api_key, alpaca_secret_key = keys.alpaca_api, keys.alpaca_secret
 
+def get_assets() -> "list[Asset]":
+    from alpaca.trading import AssetClass, TradingClient, GetAssetsRequest, AssetStatus, Asset
 
-def get_assets() -> list[Asset]:
-    client = TradingClient(api_key=alpaca_api_key, secret_key=alpaca_secret_key)
+    keys = alpaca_keys()
+    client = TradingClient(api_key=keys.api, secret_key=keys.secret)
     request = GetAssetsRequest(asset_class=AssetClass.US_EQUITY, status=AssetStatus.ACTIVE)
 
     data = cast(list[Asset], client.get_all_assets(request))
@@ -0,0 +1,241 @@
+"""
+Content-addressed cache of raw Alpha Vantage responses.
+
+Responses are keyed on the normalized request parameters without the api key, stored zstd-compressed
+in a SQLite file and expire per endpoint: daily bars go stale after the next market close, news windows
+that ended in the past never change. The store is bounded in size and evicts the least recently used entries.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+
+from src.stock_solver.dataset.utils import CACHE_DIR
+from src.stock_solver.metrics import registry
+from .results.result import Result
+
+if TYPE_CHECKING:
+    import sqlite3
+
+    import pyarrow as pa
+
+DEFAULT_PATH = Path(CACHE_DIR, "responses.sqlite")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+COMPRESSION_LEVEL = 3
+
+DAY = 24 * 60 * 60
+MARKET_TIMEZONE = "America/New_York"
+MARKET_CLOSE_HOUR = 16
+# news published shortly before a window ends can still show up, windows older than this are final
+NEWS_SETTLE = timedelta(days=1)
+NEWS_TIME_FORMAT = "%Y%m%dT%H%M"
+# seconds until an entry expires, endpoints missing here fall back to `DEFAULT_TTL`
+ENDPOINT_TTLS: Dict[str, float] = {
+    "OVERVIEW": 7 * DAY,
+    "LISTING_STATUS": DAY,
+}
+DEFAULT_TTL = DAY
+
+
+def request_key(params: Dict[str, str]) -> str:
+    """Requests are identified by their parameters without the api key."""
+    normalized = json.dumps({k: str(v) for k, v in sorted(params.items()) if k != "apikey"}, separators=(",", ":"))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def is_error_response(body: bytes) -> bool:
+    """Throttling notes and error messages come back with status 200 and must never be cached."""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return False  # csv endpoints
+    return isinstance(data, dict) and bool({str(key).lower() for key in data} & Result.error_keys)
+
+
+def next_market_close(now: float) -> float:
+    from zoneinfo import ZoneInfo
+
+    local = datetime.fromtimestamp(now, ZoneInfo(MARKET_TIMEZONE))
+    close = local.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0, microsecond=0)
+    if close <= local:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return close.timestamp()
+
+
+def expires_at(params: Dict[str, str], now: float) -> Optional[float]:
+    """Unix time after which a response for `params` is stale, `None` if it never is."""
+    function = params.get("function", "")
+    if function == "NEWS_SENTIMENT" and "time_to" in params:
+        from zoneinfo import ZoneInfo
+
+        # `time_to` is market wall time, compared in that zone rather than the host's
+        market = ZoneInfo(MARKET_TIMEZONE)
+        time_to = datetime.strptime(params["time_to"], NEWS_TIME_FORMAT).replace(tzinfo=market)
+        if time_to + NEWS_SETTLE < datetime.fromtimestamp(now, market):
+            return None
+        return next_market_close(now)
+    if function.startswith("TIME_SERIES_") or function == "INSIDER_TRANSACTIONS":
+        return next_market_close(now)
+    return now + ENDPOINT_TTLS.get(function, DEFAULT_TTL)
+
+
+@lru_cache(maxsize=None)
+def codec() -> "pa.Codec":
+    import pyarrow as pa
+
+    return pa.Codec("zstd", compression_level=COMPRESSION_LEVEL)
+
+
+def compress(body: bytes) -> bytes:
+    return codec().compress(body, asbytes=True)
+
+
+def decompress(blob: bytes, size: int) -> bytes:
+    return codec().decompress(blob, decompressed_size=size, asbytes=True)
+
+
+class ResponseCache:
+    def __init__(self, path: Path = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._connection: Optional["sqlite3.Connection"] = None
+
+    def _db(self) -> "sqlite3.Connection":
+        # opened on first use, so building a cache (and importing this module) touches no files
+        if self._connection is None:
+            import sqlite3
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, function TEXT NOT NULL, params TEXT NOT NULL, body BLOB NOT NULL, "
+                "size INTEGER NOT NULL, raw_size INTEGER NOT NULL, "
+                "created REAL NOT NULL, expires REAL, accessed REAL NOT NULL)"
+            )
+            # covers the eviction order and the stored bytes without reading the bodies
+            connection.execute("DROP INDEX IF EXISTS responses_accessed")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_size ON responses (accessed, size)")
+            self._connection = connection
+        return self._connection
+
+    def get(self, params: Dict[str, str]) -> Optional[bytes]:
+        function = params.get("function", "")
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            key = request_key(params)
+            row = db.execute("SELECT body, size, raw_size, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[3] is not None and row[3] <= now:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses[function] += 1
+                registry.inc("cache_misses_total", endpoint=function)
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        self.hits[function] += 1
+        registry.inc("cache_hits_total", endpoint=function)
+        return decompress(row[0], row[2])
+
+    def put(self, params: Dict[str, str], body: bytes):
+        if is_error_response(body):
+            return
+        now = time.time()
+        blob = compress(body)
+        normalized = json.dumps({k: v for k, v in sorted(params.items()) if k != "apikey"})
+        with self._lock:
+            db = self._db()
+            # processes sharing the file (e.g. parallel fetch workers) write one at a time,
+            # each eviction sees the bytes all of them stored
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (request_key(params), params.get("function", ""), normalized, blob, len(blob), len(body),
+                     now, expires_at(params, now), now),
+                )
+                self._evict(db)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _evict(self, db: "sqlite3.Connection"):
+        """Drops the least recently used entries until the stored bodies fit `max_bytes`."""
+        stored = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while stored > self.max_bytes:
+            rows = db.execute("SELECT rowid, size FROM responses ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                break
+            for rowid, size in rows:
+                if stored <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM responses WHERE rowid = ?", (rowid,))
+                stored -= size
+                registry.inc("cache_evictions_total")
+
+    def clear(self, functions: Optional[Iterable[str]] = None) -> int:
+        """Drops every entry, or only those of the given endpoints. Returns the number of dropped entries."""
+        with self._lock:
+            db = self._db()
+            if functions is None:
+                count = db.execute("DELETE FROM responses").rowcount
+            else:
+                functions = list(functions)
+                marks = ",".join("?" * len(functions))
+                count = db.execute(f"DELETE FROM responses WHERE function IN ({marks})", functions).rowcount
+        return count
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            db = self._db()
+            count = db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),)).rowcount
+            db.execute("VACUUM")
+        return count
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Stored entries and bytes per endpoint, with this process' hits and misses."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT function, COUNT(*), SUM(size), SUM(raw_size) FROM responses GROUP BY function"
+            ).fetchall()
+        stats = {
+            function: {"entries": entries, "bytes": size, "raw_bytes": raw_size}
+            for function, entries, size, raw_size in rows
+        }
+        for function in set(self.hits) | set(self.misses):
+            endpoint = stats.setdefault(function, {"entries": 0, "bytes": 0, "raw_bytes": 0})
+            endpoint["hits"] = self.hits[function]
+            endpoint["misses"] = self.misses[function]
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+# off until an entry point calls `configure`
+response_cache: Optional[ResponseCache] = None
+
+
+def configure(path: Optional[Path] = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_BYTES) -> Optional[ResponseCache]:
+    """Sets the cache used by `Request.query`, `path=None` disables caching."""
+    global response_cache
+    if response_cache is not None:
+        response_cache.close()
+    response_cache = None if path is None else ResponseCache(path, max_bytes)
+    return response_cache
@@ -0,0 +1,332 @@
+"""
+Local stand-in for the Alpha Vantage API.
+
+Serves recorded responses (cassettes) and, for symbols without a recording, deterministic synthetic
+`TIME_SERIES_DAILY_ADJUSTED`, `NEWS_SENTIMENT`, `OVERVIEW` and `INSIDER_TRANSACTIONS` payloads. Latency, throttling notes
+(`Note`/`Information`, the keys `Result.error_keys` detects) and 5xx errors can be injected.
+Point the wrapper at it with the `ALPHA_VANTAGE_BASE_URL` environment variable, or use `serve`.
+"""
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from .cache import is_error_response, request_key
+from .requests.request import BASE_URL, BASE_URL_ENV
+
+TIME_FORMAT = "%Y%m%dT%H%M"
+NEWS_PER_WINDOW = 5
+
+parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+parser.add_argument("--host", type=str, default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--cassette_dir", type=Path, default=None, help="Folder with recorded responses.")
+parser.add_argument("--record", action="store_true",
+                    help="Forward cassette misses to the real API and record the successful responses.")
+parser.add_argument("--no_synthetic", action="store_true", help="Answer cassette misses with 404 instead of synthetic data.")
+parser.add_argument("--days", type=int, default=250, help="Trading days of synthetic daily history.")
+parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+parser.add_argument("--throttle_rate", type=float, default=0.0, help="Probability of a Note/Information response.")
+parser.add_argument("--error_rate", type=float, default=0.0, help="Probability of a 503 response.")
+parser.add_argument("--seed", type=int, default=42)
+
+
+class Cassette:
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _file(self, params: Dict[str, str]) -> Path:
+        return self.path / params.get("function", "UNKNOWN") / f"{request_key(params)}.json"
+
+    def load(self, params: Dict[str, str]) -> Optional[bytes]:
+        file = self._file(params)
+        return file.read_bytes() if file.exists() else None
+
+    def save(self, params: Dict[str, str], body: bytes):
+        file = self._file(params)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_bytes(body)
+
+
+class SyntheticPayloads:
+    """Deterministic per-symbol payloads in the same shape the real endpoints return."""
+
+    def __init__(self, days: int = 250, seed: int = 42, end: Optional[date] = None):
+        self.days = days
+        self.seed = seed
+        self.end = date.today() if end is None else end
+
+    def _rng(self, *parts: str) -> random.Random:
+        return random.Random(zlib.crc32("|".join((str(self.seed), *parts)).encode("utf-8")))
+
+    def trading_days(self) -> List[date]:
+        days: List[date] = []
+        current = self.end
+        while len(days) < self.days:
+            if current.weekday() < 5:
+                days.append(current)
+            current -= timedelta(days=1)
+        return days[::-1]
+
+    def daily(self, symbol: str) -> Dict[str, Any]:
+        rng = self._rng("daily", symbol)
+        price = rng.uniform(10, 500)
+        series: Dict[str, Dict[str, str]] = {}
+        for day in self.trading_days():
+            open_ = price
+            price = max(1.0, price * (1 + rng.gauss(0, 0.02)))
+            high = max(open_, price) * (1 + abs(rng.gauss(0, 0.005)))
+            low = min(open_, price) * (1 - abs(rng.gauss(0, 0.005)))
+            series[day.isoformat()] = {
+                "1. open": f"{open_:.4f}",
+                "2. high": f"{high:.4f}",
+                "3. low": f"{low:.4f}",
+                "4. close": f"{price:.4f}",
+                "5. adjusted close": f"{price:.4f}",
+                "6. volume": str(rng.randint(100_000, 10_000_000)),
+                "7. dividend amount": "0.0000",
+                "8. split coefficient": "1.0",
+            }
+        return {
+            "Meta Data": {
+                "1. Information": "Daily Time Series with Splits and Dividend Events",
+                "2. Symbol": symbol,
+                "3. Last Refreshed": self.end.isoformat(),
+                "4. Output Size": "Full size",
+                "5. Time Zone": "US/Eastern",
+            },
+            "Time Series (Daily)": dict(reversed(list(series.items()))),
+        }
+
+    def news(self, symbol: str, time_from: str, time_to: str) -> Dict[str, Any]:
+        start = datetime.strptime(time_from, TIME_FORMAT)
+        end = datetime.strptime(time_to, TIME_FORMAT)
+        rng = self._rng("news", symbol, time_from)
+        feed: List[Dict[str, Any]] = []
+        span = max(1, int((end - start).total_seconds()))
+        for _ in range(NEWS_PER_WINDOW):
+            published = start + timedelta(seconds=rng.randrange(span))
+            score = rng.uniform(-1, 1)
+            feed.append({
+                "title": f"{symbol} synthetic news",
+                "time_published": published.strftime("%Y%m%dT%H%M%S"),
+                "ticker_sentiment": [{
+                    "ticker": symbol,
+                    "relevance_score": f"{rng.random():.6f}",
+                    "ticker_sentiment_score": f"{score:.6f}",
+                    "ticker_sentiment_label": "Bullish" if score > 0.15 else "Bearish" if score < -0.15 else "Neutral",
+                }],
+            })
+        feed.sort(key=lambda item: item["time_published"])
+        return {
+            "items": str(len(feed)),
+            "sentiment_score_definition": "x <= -0.35: Bearish; ... ; x >= 0.35: Bullish",
+            "relevance_score_definition": "0 < x <= 1, with a higher score indicating higher relevance.",
+            "feed": feed,
+        }
+
+    def overview(self, symbol: str) -> Dict[str, Any]:
+        rng = self._rng("overview", symbol)
+        return {
+            "Symbol": symbol,
+            "AssetType": "Common Stock",
+            "Name": f"{symbol} Synthetic Inc",
+            "MarketCapitalization": str(rng.randint(1_000_000_000, 500_000_000_000)),
+        }
+
+    def insider_transactions(self, symbol: str) -> Dict[str, Any]:
+        rng = self._rng("insider", symbol)
+        days = self.trading_days()
+        data: List[Dict[str, str]] = []
+        for day in sorted(rng.sample(days, k=min(len(days), max(1, len(days) // 20))), reverse=True):
+            data.append({
+                "transaction_date": day.isoformat(),
+                "ticker": symbol,
+                "executive": "Synthetic Executive",
+                "executive_title": "Director",
+                "security_type": "Common Stock",
+                "acquisition_or_disposal": rng.choice("AD"),
+                "shares": f"{rng.randint(100, 100_000)}.0",
+                # grants come without a price
+                "share_price": "" if rng.random() < 0.1 else f"{rng.uniform(10, 500):.2f}",
+            })
+        return {"data": data}
+
+    def payload(self, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        function = params.get("function")
+        if function == "TIME_SERIES_DAILY_ADJUSTED":
+            return self.daily(params["symbol"])
+        if function == "NEWS_SENTIMENT":
+            return self.news(params["tickers"], params["time_from"], params["time_to"])
+        if function == "OVERVIEW":
+            return self.overview(params["symbol"])
+        if function == "INSIDER_TRANSACTIONS":
+            return self.insider_transactions(params["symbol"])
+        return None
+
+
+@dataclass
+class Faults:
+    latency: float = 0.0  # seconds added to every response
+    throttle_rate: float = 0.0  # probability of a 200 response with a Note/Information body
+    error_rate: float = 0.0  # probability of a 503 response
+    seed: int = 42
+
+
+THROTTLE_BODIES = (
+    {"Note": "Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute."},
+    {"Information": "Thank you for using Alpha Vantage! This is a premium endpoint."},
+)
+
+
+@dataclass
+class ReplayStats:
+    calls: Counter[str] = field(default_factory=Counter)
+    throttled: int = 0
+    errors: int = 0
+    misses: int = 0
+    bytes_sent: int = 0
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        cassette: Optional[Cassette] = None,
+        synthetic: Optional[SyntheticPayloads] = None,
+        faults: Optional[Faults] = None,
+        record_upstream: Optional[str] = None,
+    ):
+        super().__init__(address, ReplayHandler)
+        self.cassette = cassette
+        self.synthetic = synthetic
+        self.faults = Faults() if faults is None else faults
+        self.record_upstream = record_upstream
+        self.stats = ReplayStats()
+        self.lock = threading.Lock()
+        self.rng = random.Random(self.faults.seed)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}/query"
+
+    def respond(self, params: Dict[str, str]) -> Tuple[int, bytes]:
+        with self.lock:
+            self.stats.calls[params.get("function", "UNKNOWN")] += 1
+            roll = self.rng.random()
+            throttle = self.rng.choice(THROTTLE_BODIES)
+        if roll < self.faults.error_rate:
+            with self.lock:
+                self.stats.errors += 1
+            return 503, b'{"Error": "Service Unavailable"}'
+        if roll < self.faults.error_rate + self.faults.throttle_rate:
+            with self.lock:
+                self.stats.throttled += 1
+            return 200, json.dumps(throttle).encode("utf-8")
+
+        body = self.cassette.load(params) if self.cassette is not None else None
+        if body is None and self.record_upstream is not None:
+            body = self._record(params)
+        if body is None and self.synthetic is not None:
+            payload = self.synthetic.payload(params)
+            body = None if payload is None else json.dumps(payload).encode("utf-8")
+        if body is None:
+            with self.lock:
+                self.stats.misses += 1
+            return 404, b'{"Error Message": "No recording for this request"}'
+        return 200, body
+
+    def _record(self, params: Dict[str, str]) -> Optional[bytes]:
+        import requests
+
+        response = requests.get(self.record_upstream, params=params)  # type: ignore
+        if not response.ok:
+            return None
+        # throttling notes are never recorded
+        if is_error_response(response.content):
+            return response.content
+        if self.cassette is not None:
+            self.cassette.save(params, response.content)
+        return response.content
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+
+    def do_GET(self):
+        params = dict(parse_qsl(urlsplit(self.path).query))
+        status, body = self.server.respond(params)
+        if self.server.faults.latency > 0:
+            time.sleep(self.server.faults.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.stats.bytes_sent += len(body)
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+
+@contextmanager
+def serve(
+    cassette_dir: Optional[Path] = None,
+    synthetic: Optional[SyntheticPayloads] = None,
+    faults: Optional[Faults] = None,
+    record: bool = False,
+) -> Generator[ReplayServer, None, None]:
+    """Runs a `ReplayServer` on a free local port and points the API wrapper at it for the duration of the block."""
+    server = ReplayServer(
+        cassette=None if cassette_dir is None else Cassette(cassette_dir),
+        synthetic=synthetic,
+        faults=faults,
+        record_upstream=os.environ.get(BASE_URL_ENV, BASE_URL) if record else None,
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    previous = os.environ.get(BASE_URL_ENV)
+    os.environ[BASE_URL_ENV] = server.url
+    try:
+        yield server
+    finally:
+        if previous is None:
+            os.environ.pop(BASE_URL_ENV, None)
+        else:
+            os.environ[BASE_URL_ENV] = previous
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    server = ReplayServer(
+        (args.host, args.port),
+        cassette=None if args.cassette_dir is None else Cassette(args.cassette_dir),
+        synthetic=None if args.no_synthetic else SyntheticPayloads(days=args.days, seed=args.seed),
+        faults=Faults(args.latency, args.throttle_rate, args.error_rate, args.seed),
+        record_upstream=BASE_URL if args.record else None,
+    )
+    print(f"Serving Alpha Vantage stand-in on {server.url}, export {BASE_URL_ENV}={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
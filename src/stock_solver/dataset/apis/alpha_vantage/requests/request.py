@@ -1,24 +1,66 @@
+from typing import TYPE_CHECKING
 from pydantic import BaseModel
-import requests
-from requests import Response
-from src.stock_solver.dataset.utils import api_keys
+import os
+import time
+from src.stock_solver.dataset.utils import alpha_vantage_api_key
+from src.stock_solver.metrics import registry
+from ..errors import APIError
+from .. import cache
 
-api_key = api_keys().alpha_vantage_api
+if TYPE_CHECKING:
+    from requests import Response
+
+BASE_URL = "https://www.alphavantage.co/query"
+# points the wrapper at a different server, e.g. the local stand-in in `alpha_vantage.replay`
+BASE_URL_ENV = "ALPHA_VANTAGE_BASE_URL"
 
 class Request(BaseModel):
     function: str
-    apikey: str = api_key
+    # resolved on a cache miss, so importing the API wrapper and fully cached runs need no credentials
+    apikey: str | None = None
 
     def params(self) -> dict[str, str]:
+        """Request parameters without the api key, which is only added when the request is sent."""
         return {
             "function": self.function,
-            "apikey": self.apikey,
         }
 
-    def query(self) -> Response:
-        base_url = "https://www.alphavantage.co/query"
+    def query(self) -> "Response":
+        import requests
+
+        base_url = os.environ.get(BASE_URL_ENV, BASE_URL)
         params = self.params()
-        response = requests.get(base_url, params=params)
+        response_cache = cache.response_cache
+        # responses of other servers (e.g. the replay stand-in) never mix with the real ones
+        cache_params = params if base_url == BASE_URL else {**params, "base_url": base_url}
+        if response_cache is not None:
+            body = response_cache.get(cache_params)
+            if body is not None:
+                return Request._cached_response(base_url, body)
+
+        apikey = self.apikey if self.apikey is not None else alpha_vantage_api_key()
+        t0 = time.perf_counter()
+        response = requests.get(base_url, params={**params, "apikey": apikey})
+        registry.observe("api_request_seconds", time.perf_counter() - t0, endpoint=self.function)
+        registry.inc("api_requests_total", endpoint=self.function, status=response.status_code)
+        registry.inc("api_response_bytes_total", len(response.content), endpoint=self.function)
+        if response.status_code >= 500:
+            # server side failures are transient, raised as `APIError` so callers retry them
+            raise APIError(f"Server error from Alpha Vantage: {response.reason}", data=response.status_code)
         if not response.ok:
             raise ValueError(f"Error fetching data from Alpha Vantage: {response.reason}")
-        return response
\ No newline at end of file
+        if response_cache is not None:
+            response_cache.put(cache_params, response.content)
+        return response
+
+    @staticmethod
+    def _cached_response(url: str, body: bytes) -> "Response":
+        from requests import Response
+
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = url
+        response.encoding = "utf-8"
+        response._content = body
+        return response
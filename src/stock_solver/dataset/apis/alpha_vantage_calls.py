@@ -2,18 +2,29 @@ from datetime import datetime, timedelta
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 import time
 from pathlib import Path
-from typing import Generator, Dict, List, Any
-from joblib import Memory  # type: ignore
-import pandas as pd
-from tqdm import tqdm
+from typing import TYPE_CHECKING, Generator, Dict, List, Any
 import json
 
 from ..utils import get_logger
+from ...metrics import registry, configure as configure_metrics
 from . import alpha_vantage as AV
+from .alpha_vantage import cache as response_cache
+
+# pandas and tqdm are imported inside the functions that need them,
+# importing this module stays cheap for workers and CLIs that never fetch
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
 
 TIME_STEP = timedelta(days=30)
 NEWS_LIMIT_PER_REQUEST = 500  # limit of number news to return in one time step
 
+# insider trades are filed up to two business days after they happen (SEC Form 4),
+# they only become features once they could have been known
+INSIDER_REPORTING_LAG = 2
+INSIDER_WINDOWS = (5, 21, 63)  # trading days
+INSIDER_FEATURE_COLS = [f"insider_net_value_{window}d" for window in INSIDER_WINDOWS]
+
 MAX_RETRIES = 3
 RETRY_WAIT = 60  # number of seconds to wait on api error before retrying
 
@@ -22,11 +33,19 @@ parser.add_argument('--tickers_path', type=str, default='tickers',
                     help='Path to the file containing list of tickers. Expects for each ticker to be one a seperate line.')
 parser.add_argument('--dataset_path', type=Path,
                     default=Path('.alpha_vantage_cache', 'dataset'), help="Path to the folder where data will be saved.")
-parser.add_argument('--clear_cache', action='store_true',
-                    help='Clears joblib cache')
-
-memory = Memory(".alpha_vantage_cache", verbose=0)
-logger = get_logger()
+parser.add_argument('--clear_cache', type=str, nargs='*', default=None, metavar='FUNCTION',
+                    help='Clears cached API responses of the given endpoints (e.g. NEWS_SENTIMENT), all of them if none are given.')
+parser.add_argument('--purge_expired', action='store_true',
+                    help='Drops cached API responses that went stale.')
+parser.add_argument('--cache_path', type=Path, default=response_cache.DEFAULT_PATH,
+                    help='SQLite file with the cached API responses.')
+parser.add_argument('--cache_max_mb', type=int, default=response_cache.DEFAULT_MAX_BYTES // 1024 ** 2,
+                    help='Least recently used responses are evicted above this size.')
+parser.add_argument('--no_cache', action='store_true',
+                    help='Always query the API.')
+parser.add_argument('--metrics_path', type=Path, default=None,
+                    help='Records API latency, retries, bytes and cache hit rates to this file on exit. '
+                         'Prometheus text for a .prom suffix, JSONL otherwise.')
 
 
 def time_iterator(
@@ -49,11 +68,16 @@ def time_iterator_len(start: datetime, end: datetime, step: timedelta) -> int:
     return count
 
 
-@memory.cache  # type: ignore
-def fetch_daily_OHLCV(symbol: str) -> pd.DataFrame:
+def fetch_daily_OHLCV(symbol: str) -> "pd.DataFrame":
     response = AV.TimeSeriesDailyRequest(
         symbol=symbol, outputsize="full").query()
-    result = AV.TimeSeriesResult.model_validate(response.json())
+    return parse_daily_OHLCV(response.json())
+
+
+def parse_daily_OHLCV(payload: Dict[str, Any]) -> "pd.DataFrame":
+    import pandas as pd
+
+    result = AV.TimeSeriesResult.model_validate(payload)
     raw = {ts_str: ohlcv.model_dump()
            for ts_str, ohlcv in result.time_series.items()}
     df = pd.DataFrame.from_dict(raw, orient="index")
@@ -67,13 +91,14 @@ def fetch_daily_OHLCV(symbol: str) -> pd.DataFrame:
     return df
 
 
-@memory.cache  # type: ignore
 def fetch_overview(symbol: str):
     return AV.OverviewRequest(symbol=symbol).query().json()
 
 
-@memory.cache  # type: ignore
-def fetch_news_sentiment(symbol: str, time_from: datetime, time_to: datetime) -> pd.DataFrame:
+def fetch_news_sentiment(symbol: str, time_from: datetime, time_to: datetime) -> "pd.DataFrame":
+    import pandas as pd
+    from tqdm import tqdm
+
     raw: Dict[str, Any] = {}
     columns = ["relevance_score", "ticker_sentiment_score"]
     for start, end in tqdm(
@@ -91,6 +116,7 @@ def fetch_news_sentiment(symbol: str, time_from: datetime, time_to: datetime) ->
         try:
             result = AV.NewsResult.model_validate(response.json())
         except:
+            registry.inc("api_invalid_responses_total", endpoint="NEWS_SENTIMENT")
             continue
 
         # Each item in the feed has a list of tickers that are mentioned in the article,
@@ -112,7 +138,9 @@ def fetch_news_sentiment(symbol: str, time_from: datetime, time_to: datetime) ->
     return df
 
 
-def aggregate_news_sentiment(raw: pd.DataFrame) -> pd.DataFrame:
+def aggregate_news_sentiment(raw: "pd.DataFrame") -> "pd.DataFrame":
+    import pandas as pd
+
     idx = pd.to_datetime(raw.index, utc=True,
                          errors='coerce').tz_convert("America/New_York")
     group = idx.normalize()
@@ -132,7 +160,82 @@ def aggregate_news_sentiment(raw: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
-def build_features_for_ticker(symbol: str) -> pd.DataFrame:
+def fetch_insider_transactions(symbol: str) -> "pd.DataFrame":
+    import numpy as np
+    import pandas as pd
+
+    response = AV.InsiderTransactionsRequest(symbol=symbol).query()
+    try:
+        result = AV.InsiderTransactionsResult.model_validate(response.json())
+    except AV.APIError:
+        # throttling, retried by `save_data`
+        raise
+    except Exception as error:
+        # insider data is optional, the ticker is still saved with all insider features at zero
+        registry.inc("api_invalid_responses_total", endpoint="INSIDER_TRANSACTIONS")
+        get_logger().warning(f"{symbol} | no insider transactions: {error}")
+        return pd.DataFrame({"shares": [], "value": [], "acquired": []},
+                            index=pd.DatetimeIndex([], name="date")).astype({"acquired": bool})
+    # string fields are converted column-wise, once per column rather than once per transaction
+    columns = {field: [getattr(item, field) for item in result.data]
+               for field in ("transaction_date", "shares", "share_price", "acquisition_or_disposal")}
+    dates = pd.to_datetime(pd.Series(columns["transaction_date"], dtype=object), errors="coerce")
+    shares = pd.to_numeric(pd.Series(columns["shares"], dtype=object), errors="coerce").to_numpy(np.float64)
+    price = pd.to_numeric(pd.Series(columns["share_price"], dtype=object), errors="coerce").to_numpy(np.float64)
+    df = pd.DataFrame({
+        "shares": shares,
+        # grants and option exercises are often reported without a price
+        "value": np.nan_to_num(shares * price, nan=0.0),
+        "acquired": np.asarray(columns["acquisition_or_disposal"], dtype=object) == "A",
+    }, index=pd.DatetimeIndex(dates, name="date"))
+    return df[df.index.notna()].sort_index()
+
+
+def signed_log1p(values: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    return np.sign(values) * np.log1p(np.abs(values))
+
+
+def aggregate_insider_transactions(raw: "pd.DataFrame", index: "pd.DatetimeIndex") -> "pd.DataFrame":
+    """
+    Insider activity on the trading days of `index`: dollar value acquired and disposed per day,
+    and the net value (signed log1p of dollars) and number of trades over the trailing `INSIDER_WINDOWS`.
+    """
+    import numpy as np
+    import pandas as pd
+
+    from pandas.tseries.offsets import BDay
+
+    # as-of join, every trade lands on the first trading day it was known,
+    # trades known before the first day of `index` have no row and are dropped
+    known = (raw.index + BDay(INSIDER_REPORTING_LAG)).values
+    rows = np.searchsorted(index.values, known, side="left")
+    inside = (rows < len(index)) & (known >= index.values[0]) if len(index) else np.zeros(len(rows), dtype=bool)
+    rows = rows[inside]
+    value = raw["value"].to_numpy(np.float64)[inside]
+    acquired = raw["acquired"].to_numpy(bool)[inside]
+
+    acquired_value = np.bincount(rows, weights=np.where(acquired, value, 0.0), minlength=len(index))
+    disposed_value = np.bincount(rows, weights=np.where(acquired, 0.0, value), minlength=len(index))
+    trades = np.bincount(rows, minlength=len(index)).astype(np.float64)
+
+    out = {
+        "insider_acquired_value": acquired_value.astype(np.float32),
+        "insider_disposed_value": disposed_value.astype(np.float32),
+    }
+    # trailing sums as differences of cumulative sums, O(days) for every window
+    net = np.concatenate([[0.0], np.cumsum(acquired_value - disposed_value)])
+    count = np.concatenate([[0.0], np.cumsum(trades)])
+    stop = np.arange(1, len(index) + 1)
+    for window in INSIDER_WINDOWS:
+        start = np.maximum(stop - window, 0)
+        out[f"insider_net_value_{window}d"] = signed_log1p(net[stop] - net[start]).astype(np.float32)
+        out[f"insider_trades_{window}d"] = (count[stop] - count[start]).astype(np.float32)
+    return pd.DataFrame(out, index=index)
+
+
+def build_features_for_ticker(symbol: str) -> "pd.DataFrame":
     time_series_df = fetch_daily_OHLCV(symbol)
     min_date = time_series_df.index.min()
 
@@ -143,6 +246,9 @@ def build_features_for_ticker(symbol: str) -> pd.DataFrame:
     # We get NaNs when performing the join on missing entries for news
     time_series_df = time_series_df.join(news_df, how="left")
     time_series_df[news_cols] = time_series_df[news_cols].fillna(0.0)
+
+    insider_df = aggregate_insider_transactions(fetch_insider_transactions(symbol), time_series_df.index)
+    time_series_df = time_series_df.join(insider_df)
     return time_series_df
 
 
@@ -151,6 +257,9 @@ def save_data(
     path: Path = Path(".alpha_vantage_cache", "dataset"),
     overwrite: bool = False,
 ):
+    from tqdm import tqdm
+
+    logger = get_logger()
     path.mkdir(parents=True, exist_ok=True)
     logger.info(f"Started to process len(symbols) tickers")
     for symbol in tqdm(symbols, total=len(symbols), desc="Saving features for tickers"):
@@ -164,6 +273,7 @@ def save_data(
                 break
             except AV.APIError as api_error:
                 attempt += 1
+                registry.inc("ingest_retries_total")
                 logger.error(f"{symbol} | {api_error}")
                 if attempt < MAX_RETRIES:
                     time.sleep(RETRY_WAIT)
@@ -211,7 +321,9 @@ def update_manifest_entry(ticker: str, file_name: str, manifest_path: Path):
     manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
 
 
-def load_data(path: Path = Path(".alpha_vantage_cache", "dataset")) -> Dict[str, pd.DataFrame]:
+def load_data(path: Path = Path(".alpha_vantage_cache", "dataset")) -> Dict[str, "pd.DataFrame"]:
+    import pandas as pd
+
     manifest_path = path / "manifest.json"
 
     manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
@@ -221,12 +333,13 @@ def load_data(path: Path = Path(".alpha_vantage_cache", "dataset")) -> Dict[str,
         file = path / item["file"]
         df = pd.read_parquet(file, engine='pyarrow')  # type: ignore
         df["date"] = pd.to_datetime(df["date"], utc=False, errors='raise')
-        data[ticker] = df
+        data[ticker] = df.set_index("date")
     return data
 
 
-@memory.cache  # type: ignore
 def filter_tickers(all_tickers: List[str]) -> List[str]:
+    from tqdm import tqdm
+
     tickers: List[str] = []
     for ticker in tqdm(all_tickers, total=len(all_tickers), desc='Choosing Tickers'):
         response = AV.OverviewRequest(symbol=ticker).query()
@@ -240,8 +353,12 @@ def filter_tickers(all_tickers: List[str]) -> List[str]:
 
 if __name__ == '__main__':
     args = parser.parse_args()
-    if args.clear_cache:
-        memory.clear()
+    configure_metrics(args.metrics_path)
+    cache = response_cache.configure(None if args.no_cache else args.cache_path, args.cache_max_mb * 1024 ** 2)
+    if cache is not None and args.clear_cache is not None:
+        cache.clear(args.clear_cache or None)
+    if cache is not None and args.purge_expired:
+        cache.purge_expired()
     with open(args.tickers_path, 'r', encoding='utf-8') as file:
         tickers = file.readlines()
     tickers = [ticker.strip() for ticker in tickers]
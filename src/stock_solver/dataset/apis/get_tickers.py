@@ -1,5 +1,6 @@
 from argparse import ArgumentParser
 from .alpaca import get_assets
+from .alpha_vantage import cache
 from .alpha_vantage_calls import filter_tickers
 
 parser = ArgumentParser()
@@ -17,4 +18,5 @@ def get_tickers(path: str):
 
 if __name__ == '__main__':
     args = parser.parse_args()
+    cache.configure()
     get_tickers(args.path)
@@ -1,10 +1,12 @@
+import copy
 import torch
 import pandas as pd
 import numpy as np
 
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, TypeAlias
+from typing import Dict, List, Optional, Tuple, TypeAlias
 from .apis.alpha_vantage_calls import load_data
+from ..metrics import registry
 
 TrainElement: TypeAlias = Tuple[Tuple[torch.Tensor, torch.Tensor], Tuple[torch.Tensor, torch.Tensor], int]
 TestElement: TypeAlias = Tuple[Tuple[torch.Tensor, torch.Tensor], torch.Tensor, int]
@@ -20,9 +22,18 @@ class MultiTickerDataset(torch.utils.data.Dataset[Element]):
     feature_cols: List[str] = ["open", "high", "low", "adjusted_close", "news_sentiment_wmean"]
     target_col: str = "close"
 
-    def __init__(self, data: Dict[str, pd.DataFrame], lookback: int, horizon: int, is_test: bool = False):
+    def __init__(
+        self,
+        data: Dict[str, pd.DataFrame],
+        lookback: int,
+        horizon: int,
+        is_test: bool = False,
+        feature_cols: Optional[List[str]] = None,
+    ):
         super().__init__()
         self.is_test = is_test
+        # e.g. `MultiTickerDataset.feature_cols + INSIDER_FEATURE_COLS`
+        self.feature_cols = MultiTickerDataset.feature_cols if feature_cols is None else list(feature_cols)
 
         self.data = data
         self.L = lookback
@@ -33,36 +44,83 @@ class MultiTickerDataset(torch.utils.data.Dataset[Element]):
         self.tickers = list(data.keys())
         self.win: List[WindowIndex] = []
 
+        xs: List[np.ndarray] = []
+        ys: List[np.ndarray] = []
         for ticker_id, ticker in enumerate(self.tickers):
             df = data[ticker]
             self.dates.append(pd.DatetimeIndex(df.index))
-            x = df[MultiTickerDataset.feature_cols].to_numpy(dtype=np.float32)
-            self.X.append(x)
+            xs.append(df[self.feature_cols].to_numpy(dtype=np.float32))
             if not is_test:
-                y = df[MultiTickerDataset.target_col].to_numpy(dtype=np.float32)
-                self.Y.append(y)
+                ys.append(df[MultiTickerDataset.target_col].to_numpy(dtype=np.float32))
             for date_index in range(self.L, len(df) - self.H):
                 self.win.append(WindowIndex(ticker_id=ticker_id, start=date_index - self.L))
 
+        # All tickers live in one contiguous buffer, `X`, `Y` and `marks` hold per-ticker views into it
+        lengths = np.array([len(dates) for dates in self.dates], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        num_features = len(self.feature_cols)
+        self.flat_X = np.concatenate(xs) if xs else np.empty((0, num_features), dtype=np.float32)
+        self.flat_Y = np.concatenate(ys) if ys else np.empty(0, dtype=np.float32)
+        all_dates = pd.DatetimeIndex(np.concatenate([d.values for d in self.dates])) if self.dates else pd.DatetimeIndex([])
+        self.flat_marks = MultiTickerDataset._date_mark_array(all_dates)
+        spans = list(zip(self.offsets[:-1], self.offsets[1:]))
+        self.X = [self.flat_X[lo:hi] for lo, hi in spans]
+        self.Y = [self.flat_Y[lo:hi] for lo, hi in spans] if not is_test else []
+        self.marks: List[np.ndarray] = [self.flat_marks[lo:hi] for lo, hi in spans]
+
+    def windows_between(
+        self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None
+    ) -> List[WindowIndex]:
+        """Windows whose last forecasted day falls into [start, end)."""
+        windows: List[WindowIndex] = []
+        for ticker_id, dates in enumerate(self.dates):
+            lo = 0 if start is None else int(dates.searchsorted(start, side="left"))
+            hi = len(dates) if end is None else int(dates.searchsorted(end, side="left"))
+            # the window starting at `s` forecasts up to the row s + L + H - 1
+            first = max(0, lo - self.L - self.H + 1)
+            last = min(len(dates) - self.L - self.H, hi - self.L - self.H + 1)
+            windows.extend(WindowIndex(ticker_id=ticker_id, start=s) for s in range(first, last))
+        return windows
+
+    def subset(self, windows: List[WindowIndex]) -> "MultiTickerDataset":
+        """View of the dataset restricted to `windows`, the feature buffers are shared, not copied."""
+        view = copy.copy(self)
+        view.win = windows
+        return view
+
+    def split_by_date(
+        self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None
+    ) -> "MultiTickerDataset":
+        return self.subset(self.windows_between(start, end))
+
     @staticmethod
-    def _date_mark(idx: pd.DatetimeIndex) -> torch.Tensor:
+    def _date_mark_array(idx: pd.DatetimeIndex) -> np.ndarray:
         month = idx.month.values
         day = idx.day.values
         weekday = idx.weekday.values
-        mark = np.stack([month, day, weekday], axis=1)
-        return torch.from_numpy(mark)
+        return np.stack([month, day, weekday], axis=1).astype(np.int64)
+
+    @staticmethod
+    def _date_mark(idx: pd.DatetimeIndex) -> torch.Tensor:
+        return torch.from_numpy(MultiTickerDataset._date_mark_array(idx))
  
     def __len__(self) -> int:
         return len(self.win)
 
     def __getitem__(self, idx: int) -> Element:
+        if not registry.enabled:
+            return self._getitem(idx)
+        with registry.timer("dataset_getitem_seconds"):
+            return self._getitem(idx)
+
+    def _getitem(self, idx: int) -> Element:
         # TODO: add normalization here
         window = self.win[idx]
         ticker_id, start = window.ticker_id, window.start
         x = self.X[ticker_id][start: start + self.L]
         x = torch.from_numpy(x)
-        enc_marks = MultiTickerDataset._date_mark(self.dates[ticker_id][start: start + self.L])
-        dec_marks = MultiTickerDataset._date_mark(self.dates[ticker_id][start + self.L: start + self.L + self.H])
+        enc_marks = torch.from_numpy(self.marks[ticker_id][start: start + self.L])
+        dec_marks = torch.from_numpy(self.marks[ticker_id][start + self.L: start + self.L + self.H])
         if not self.is_test:
             y = self.Y[ticker_id][start + self.L: start + self.L + self.H]
             y = torch.from_numpy(y) 
@@ -70,13 +128,75 @@ class MultiTickerDataset(torch.utils.data.Dataset[Element]):
         return (x, enc_marks), dec_marks, ticker_id
 
 
-def collate(batch: List[Element]):
-    xs, ys, ticker_ids, enc_marks, dec_marks = batch
-    x = torch.stack(xs, dim=0)
-    y = torch.stack(ys, dim=0)
-    ticker_ids = torch.tensor(ticker_ids, dtype=torch.int64)
-    enc_mark = torch.stack(enc_marks, dim=0).long()
-    dec_mark = torch.stack(dec_marks, dim=0).long()
+class DateAlignedDataset(torch.utils.data.Dataset[Element]):
+    """
+    Cross-sectional view of a `MultiTickerDataset`: item `i` is an already batched element holding
+    every ticker whose window is forecasted from the i-th trading date (the last lookback day).
+    Only the windows in `dataset.win` are used, so subsets such as `dataset.split_by_date(...)` work too.
+    Use with `DataLoader(..., batch_size=None)`.
+    """
+
+    def __init__(self, dataset: MultiTickerDataset, min_tickers: int = 1):
+        super().__init__()
+        self.dataset = dataset
+        L = dataset.L
+
+        # global trading calendar and the ticker x date presence bitmap
+        self.calendar = pd.DatetimeIndex(np.unique(np.concatenate([d.values for d in dataset.dates])))
+        num_tickers = len(dataset.tickers)
+        self.presence = np.zeros((num_tickers, len(self.calendar)), dtype=bool)
+        # row of every (ticker, date) in the ticker's own arrays, -1 when the ticker did not trade
+        self.rows = np.full((num_tickers, len(self.calendar)), -1, dtype=np.int32)
+        # calendar column of every row of the contiguous buffers
+        flat_columns = np.empty(dataset.offsets[-1], dtype=np.int64)
+        for ticker_id, dates in enumerate(dataset.dates):
+            columns = self.calendar.searchsorted(dates)
+            self.presence[ticker_id, columns] = True
+            self.rows[ticker_id, columns] = np.arange(len(dates))
+            flat_columns[dataset.offsets[ticker_id]:dataset.offsets[ticker_id + 1]] = columns
+
+        # a window starting at s is forecasted from its last lookback row s + L - 1
+        ticker_ids = np.fromiter((w.ticker_id for w in dataset.win), dtype=np.int64, count=len(dataset.win))
+        starts = np.fromiter((w.start for w in dataset.win), dtype=np.int64, count=len(dataset.win))
+        self.valid = np.zeros((num_tickers, len(self.calendar)), dtype=bool)
+        self.valid[ticker_ids, flat_columns[dataset.offsets[ticker_ids] + starts + L - 1]] = True
+        self.date_ids = np.flatnonzero(self.valid.sum(axis=0) >= min_tickers)
+        self._steps = np.arange(L + dataset.H)
+
+    def __len__(self) -> int:
+        return len(self.date_ids)
+
+    def __getitem__(self, idx: int) -> Element:
+        date_id = self.date_ids[idx]
+        dataset = self.dataset
+        ticker_ids = np.flatnonzero(self.valid[:, date_id])
+        starts = dataset.offsets[ticker_ids] + self.rows[ticker_ids, date_id] - dataset.L + 1
+        # [B, L + H] rows of the contiguous buffers, every tensor below is a single fancy-index gather
+        rows = starts[:, None] + self._steps
+        enc_rows, dec_rows = rows[:, :dataset.L], rows[:, dataset.L:]
+        x = torch.from_numpy(dataset.flat_X[enc_rows])
+        enc_marks = torch.from_numpy(dataset.flat_marks[enc_rows])
+        dec_marks = torch.from_numpy(dataset.flat_marks[dec_rows])
+        ids = torch.from_numpy(ticker_ids)
+        if not dataset.is_test:
+            y = torch.from_numpy(dataset.flat_Y[dec_rows])
+            return (x, enc_marks), (y, dec_marks), ids  # type: ignore
+        return (x, enc_marks), dec_marks, ids  # type: ignore
+
+    def date(self, idx: int) -> pd.Timestamp:
+        return self.calendar[self.date_ids[idx]]
+
+
+def collate(batch: List[TrainElement]):
+    with registry.timer("dataset_collate_seconds"):
+        inputs, targets, ticker_ids = zip(*batch)
+        xs, enc_marks = zip(*inputs)
+        ys, dec_marks = zip(*targets)
+        x = torch.stack(xs, dim=0)
+        y = torch.stack(ys, dim=0)
+        ticker_ids = torch.tensor(ticker_ids, dtype=torch.int64)
+        enc_mark = torch.stack(enc_marks, dim=0).long()
+        dec_mark = torch.stack(dec_marks, dim=0).long()
     return x, y, ticker_ids, enc_mark, dec_mark
 
 
@@ -0,0 +1,350 @@
+"""
+Technical features computed for all tickers at once on the contiguous bar buffer
+(`resampling.flatten` layout: rows of a ticker are contiguous, `offsets` delimits the tickers).
+
+Rolling sums are differences of cumulative sums restarted at every ticker, rolling extremes reduce strided
+window views and exponential averages step through the time positions with every ticker updated in the same
+numpy call. Missing values (e.g. a close that failed to parse) are skipped like pandas `rolling`/`ewm` skip them,
+they never spread to later rows or other tickers.
+`FeatureEngine` keeps the rolling state of every ticker (running window sums, exponential averages and a short
+ring buffer of recent bars), so appending a day costs O(features) rather than a recompute of the history.
+Only the high/low range scans its window, `range_windows` are short. The state can be saved and restored
+with `save`/`load`.
+"""
+import json
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .resampling import ADJUSTED_CLOSE, CLOSE, HIGH, LOW, VOLUME, flatten
+
+
+@dataclass(frozen=True)
+class FeatureSpec:
+    volatility_windows: Tuple[int, ...] = (5, 21)  # std of daily returns
+    sma_windows: Tuple[int, ...] = (5, 21)  # adjusted close relative to its simple moving average
+    range_windows: Tuple[int, ...] = (14,)  # position of the close within the high/low range
+    rsi_period: Optional[int] = 14  # Wilder's RSI, scaled to [0, 1]
+    macd: Optional[Tuple[int, int, int]] = (12, 26, 9)  # fast, slow, signal spans, relative to the slow average
+
+    def columns(self) -> List[str]:
+        columns = ["return", "log_volume"]
+        columns += [f"volatility_{w}d" for w in self.volatility_windows]
+        columns += [f"sma_ratio_{w}d" for w in self.sma_windows]
+        columns += [f"range_position_{w}d" for w in self.range_windows]
+        if self.rsi_period is not None:
+            columns.append(f"rsi_{self.rsi_period}")
+        if self.macd is not None:
+            columns += ["macd", "macd_signal", "macd_hist"]
+        return columns
+
+    @property
+    def max_window(self) -> int:
+        return max((1, *self.volatility_windows, *self.sma_windows, *self.range_windows))
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "FeatureSpec":
+        """Inverse of `dataclasses.asdict`, which turns the tuples into lists."""
+        return cls(**{k: tuple(v) if isinstance(v, list) else v for k, v in values.items()})
+
+
+# arrays of the rolling state of a `FeatureEngine`
+STATE = ("count", "previous", "ring", "averages", "sums", "valid", "signal")
+
+
+def segment_starts(offsets: np.ndarray) -> np.ndarray:
+    """First row of the own ticker for every row."""
+    return np.repeat(offsets[:-1], np.diff(offsets))
+
+
+def rolling_sum(x: np.ndarray, offsets: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Sums and counts of the non-NaN values over the trailing `window` rows of the same ticker."""
+    valid = ~np.isnan(x)
+    lengths = np.diff(offsets)
+    width = int(lengths.max(initial=0)) + 1
+    position = np.arange(len(x)) - segment_starts(offsets)
+    # [tickers, width] with a leading zero per ticker, so every ticker's cumulative sum starts over
+    slot = np.repeat(np.arange(len(lengths)) * width, lengths) + position + 1
+    padded = np.zeros((len(lengths) * width, 2, *x.shape[1:]))
+    padded[slot, 0] = np.where(valid, x, 0.0)
+    padded[slot, 1] = valid
+    padded = np.cumsum(padded.reshape(len(lengths), width, *padded.shape[1:]), axis=1).reshape(padded.shape)
+    totals = padded[slot] - padded[slot - position - 1 + np.maximum(position - window + 1, 0)]
+    return totals[:, 0], totals[:, 1]
+
+
+def rolling_extreme(
+    x: np.ndarray, offsets: np.ndarray, window: int, reduce: Callable[..., np.ndarray]
+) -> np.ndarray:
+    """`reduce` (np.nanmax, np.nanmin) over the trailing `window` rows of the same ticker."""
+    padded = np.concatenate([np.full(window - 1, np.nan), x])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    position = np.arange(len(x)) - segment_starts(offsets)
+    before_start = np.arange(window) < (window - 1 - position)[:, None]
+    return reduce(np.where(before_start, np.nan, windows), axis=1)
+
+
+def ema(x: np.ndarray, offsets: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+    """
+    Exponential moving averages of the columns of `x` ([rows, k]) with smoothing `alpha` ([k]),
+    each ticker starts at its first value. Loops over time positions, not tickers.
+    NaNs are skipped, as `pd.Series.ewm(alpha=alpha, adjust=False, ignore_na=True).mean()` does.
+    """
+    out = np.empty_like(x)
+    lengths = np.diff(offsets)
+    order = np.argsort(-lengths, kind="stable")
+    starts, lengths = offsets[:-1][order], lengths[order]
+    active = starts[lengths > 0]
+    out[active] = x[active]
+    for position in range(1, int(lengths.max(initial=0))):
+        # tickers are sorted by length, the ones still going are a prefix
+        rows = starts[:np.searchsorted(-lengths, -position, side="left")] + position
+        out[rows] = ema_step(out[rows - 1], x[rows], alpha)
+    return out
+
+
+def ema_step(previous: np.ndarray, x: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+    """Next exponential average, starts at the first non-NaN value and keeps its value over NaNs."""
+    step = np.where(np.isnan(x), previous, alpha * x + (1 - alpha) * previous)
+    return np.where(np.isnan(previous), x, step)
+
+
+def window_mean(sums: np.ndarray, count: np.ndarray) -> np.ndarray:
+    """NaN for windows without values."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / count
+
+
+def window_std(sums: np.ndarray, squares: np.ndarray, count: np.ndarray) -> np.ndarray:
+    """Population standard deviation from the sums of values and squares."""
+    return np.sqrt(np.maximum(window_mean(squares, count) - window_mean(sums, count) ** 2, 0.0))
+
+
+def relative_strength(gain: np.ndarray, loss: np.ndarray) -> np.ndarray:
+    total = gain + loss
+    return np.divide(gain, total, out=np.full_like(total, 0.5), where=total > 0)
+
+
+def range_position(close: np.ndarray, high: np.ndarray, low: np.ndarray) -> np.ndarray:
+    span = high - low
+    return np.divide(close - low, span, out=np.full_like(span, 0.5), where=span > 0)
+
+
+class FeatureEngine:
+    """
+    `transform` computes the features of whole histories and remembers the tail of every ticker,
+    `update` then appends one bar per ticker from that state.
+    """
+
+    def __init__(self, spec: FeatureSpec = FeatureSpec(), num_tickers: int = 0):
+        self.spec = spec
+        self._reset(num_tickers)
+
+    @property
+    def columns(self) -> List[str]:
+        return self.spec.columns()
+
+    def _alphas(self) -> np.ndarray:
+        alphas: List[float] = []
+        if self.spec.rsi_period is not None:
+            alphas += [1 / self.spec.rsi_period] * 2
+        if self.spec.macd is not None:
+            fast, slow, _ = self.spec.macd
+            alphas += [2 / (fast + 1), 2 / (slow + 1)]
+        return np.array(alphas)
+
+    def _sum_keys(self) -> List[Tuple[int, int, bool]]:
+        """(ring column, window, squared) of every running sum: returns and squared returns, adjusted closes."""
+        keys = [(0, w, squared) for w in self.spec.volatility_windows for squared in (False, True)]
+        return keys + [(1, w, False) for w in self.spec.sma_windows]
+
+    def _reset(self, num_tickers: int):
+        window = self.spec.max_window
+        self.count = np.zeros(num_tickers, dtype=np.int64)
+        self.previous = np.full(num_tickers, np.nan)  # last adjusted close
+        # ring buffers of the last `max_window` returns, adjusted closes, highs and lows
+        self.ring = np.zeros((num_tickers, window, 4))
+        # exponential averages: [rsi gain, rsi loss,] [macd fast, macd slow], NaN until the first value
+        self.averages = np.full((num_tickers, len(self._alphas())), np.nan)
+        # running window sums of the non-NaN values and their number, see `_sum_keys`
+        self.sums = np.zeros((num_tickers, len(self._sum_keys())))
+        self.valid = np.zeros((num_tickers, len(self._sum_keys())))
+        self.signal = np.full(num_tickers, np.nan)
+
+    def state_dict(self) -> Dict[str, Any]:
+        """The rolling state of every ticker, `load_state_dict` continues from it."""
+        return {"spec": asdict(self.spec), **{name: getattr(self, name).copy() for name in STATE}}
+
+    def load_state_dict(self, state: Dict[str, Any]):
+        spec = FeatureSpec.from_dict(state["spec"])
+        if spec != self.spec:
+            raise ValueError(f"State was recorded with {spec}, the engine uses {self.spec}")
+        for name in STATE:
+            setattr(self, name, np.array(state[name], dtype=getattr(self, name).dtype))
+
+    def save(self, path: Path):
+        """Writes the rolling state to an `.npz` file."""
+        state = self.state_dict()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as file:
+            np.savez(file, spec=np.array(json.dumps(state.pop("spec"))), **state)
+
+    @classmethod
+    def load(cls, path: Path) -> "FeatureEngine":
+        with np.load(path) as arrays:
+            state = {name: arrays[name] for name in STATE}
+            spec = json.loads(str(arrays["spec"]))
+        engine = cls(FeatureSpec.from_dict(spec))
+        engine.load_state_dict({"spec": spec, **state})
+        return engine
+
+    def transform(self, values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Features of `values` ([rows, len(BAR_COLS)], `flatten` layout), float32 [rows, len(columns)]."""
+        spec = self.spec
+        adjusted, volume = values[:, ADJUSTED_CLOSE], values[:, VOLUME]
+        first = np.zeros(len(values), dtype=bool)
+        first[offsets[:-1][np.diff(offsets) > 0]] = True
+        previous = np.concatenate([[np.nan], adjusted[:-1]])
+        delta = np.where(first, 0.0, adjusted - previous)
+        returns = np.where(first, 0.0, delta / np.where(first, 1.0, previous))
+
+        columns: List[np.ndarray] = [returns, np.log1p(volume)]
+        for w in spec.volatility_windows:
+            moments, count = rolling_sum(np.stack([returns, returns ** 2], axis=1), offsets, w)
+            columns.append(window_std(moments[:, 0], moments[:, 1], count[:, 0]))
+        for w in spec.sma_windows:
+            total, count = rolling_sum(adjusted, offsets, w)
+            columns.append(adjusted / window_mean(total, count) - 1)
+        for w in spec.range_windows:
+            high = rolling_extreme(values[:, HIGH], offsets, w, np.nanmax)
+            low = rolling_extreme(values[:, LOW], offsets, w, np.nanmin)
+            columns.append(range_position(values[:, CLOSE], high, low))
+
+        inputs: List[np.ndarray] = []
+        if spec.rsi_period is not None:
+            inputs += [np.maximum(delta, 0.0), np.maximum(-delta, 0.0)]
+        if spec.macd is not None:
+            inputs += [adjusted, adjusted]
+        averages = ema(np.stack(inputs, axis=1), offsets, self._alphas()) if inputs else np.empty((len(values), 0))
+        signal = np.zeros(len(values))
+        if spec.rsi_period is not None:
+            columns.append(relative_strength(averages[:, 0], averages[:, 1]))
+        if spec.macd is not None:
+            fast, slow = averages[:, -2], averages[:, -1]
+            macd = (fast - slow) / slow
+            signal = ema(macd[:, None], offsets, np.array([2 / (spec.macd[2] + 1)]))[:, 0]
+            columns += [macd, signal, macd - signal]
+
+        self._remember(values, offsets, returns, averages, signal)
+        return np.stack(columns, axis=1).astype(np.float32)
+
+    def _remember(self, values: np.ndarray, offsets: np.ndarray, returns: np.ndarray, averages: np.ndarray, signal: np.ndarray):
+        num_tickers = len(offsets) - 1
+        self._reset(num_tickers)
+        lengths = np.diff(offsets)
+        has_rows = np.flatnonzero(lengths > 0)
+        last = offsets[1:][has_rows] - 1
+        self.count[has_rows] = lengths[has_rows]
+        self.previous[has_rows] = values[last, ADJUSTED_CLOSE]
+        self.averages[has_rows] = averages[last]
+        self.signal[has_rows] = signal[last]
+        series = np.stack([returns, values[:, ADJUSTED_CLOSE], values[:, HIGH], values[:, LOW]], axis=1)
+        window = self.spec.max_window
+        for back in range(min(window, int(lengths.max(initial=0)))):
+            filled = has_rows[lengths[has_rows] > back]
+            rows = offsets[1:][filled] - 1 - back
+            self.ring[filled, (self.count[filled] - 1 - back) % window] = series[rows]
+        all_tickers = np.arange(num_tickers)
+        for i, (column, w, squared) in enumerate(self._sum_keys()):
+            trailing, _ = self._trailing(all_tickers, w, column)
+            self.sums[:, i] = np.nansum(trailing ** 2 if squared else trailing, axis=1)
+            self.valid[:, i] = np.sum(~np.isnan(trailing), axis=1)
+
+    def _trailing(self, ticker_ids: np.ndarray, window: int, column: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Last `window` values of a ring column, NaN where the ticker has fewer rows."""
+        back = np.arange(window)
+        count = self.count[ticker_ids]
+        slots = (count[:, None] - 1 - back) % self.spec.max_window
+        values = self.ring[ticker_ids[:, None], slots, column]
+        return np.where(back < count[:, None], values, np.nan), np.minimum(count, window)
+
+    def update(self, ticker_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Appends one bar ([len(ticker_ids), len(BAR_COLS)]) to each of `ticker_ids` and returns their features,
+        equal to the last rows `transform` would give for the extended histories.
+        """
+        spec = self.spec
+        adjusted = values[:, ADJUSTED_CLOSE]
+        first = self.count[ticker_ids] == 0
+        previous = self.previous[ticker_ids]
+        delta = np.where(first, 0.0, adjusted - previous)
+        returns = np.where(first, 0.0, delta / np.where(first, 1.0, previous))
+
+        count = self.count[ticker_ids]
+        new = np.stack([returns, adjusted, values[:, HIGH], values[:, LOW]], axis=1)
+        sums, valid = self.sums[ticker_ids], self.valid[ticker_ids]
+        for i, (column, w, squared) in enumerate(self._sum_keys()):
+            # the value leaving the window (NaN if none), read before its ring slot can be overwritten
+            old = np.where(count >= w, self.ring[ticker_ids, (count - w) % spec.max_window, column], np.nan)
+            entering = new[:, column] ** 2 if squared else new[:, column]
+            leaving = old ** 2 if squared else old
+            sums[:, i] += np.nan_to_num(entering) - np.nan_to_num(leaving)
+            valid[:, i] += np.isnan(leaving).astype(np.float64) - np.isnan(entering)
+        self.sums[ticker_ids], self.valid[ticker_ids] = sums, valid
+        self.ring[ticker_ids, count % spec.max_window] = new
+        self.count[ticker_ids] = count + 1
+        self.previous[ticker_ids] = adjusted
+
+        columns: List[np.ndarray] = [returns, np.log1p(values[:, VOLUME])]
+        keys = {key: i for i, key in enumerate(self._sum_keys())}
+        for w in spec.volatility_windows:
+            i, j = keys[0, w, False], keys[0, w, True]
+            columns.append(window_std(sums[:, i], sums[:, j], valid[:, i]))
+        for w in spec.sma_windows:
+            i = keys[1, w, False]
+            columns.append(adjusted / window_mean(sums[:, i], valid[:, i]) - 1)
+        for w in spec.range_windows:
+            high = np.nanmax(self._trailing(ticker_ids, w, 2)[0], axis=1)
+            low = np.nanmin(self._trailing(ticker_ids, w, 3)[0], axis=1)
+            columns.append(range_position(values[:, CLOSE], high, low))
+
+        inputs: List[np.ndarray] = []
+        if spec.rsi_period is not None:
+            inputs += [np.maximum(delta, 0.0), np.maximum(-delta, 0.0)]
+        if spec.macd is not None:
+            inputs += [adjusted, adjusted]
+        if inputs:
+            x = np.stack(inputs, axis=1)
+            alpha = self._alphas()
+            averages = ema_step(self.averages[ticker_ids], x, alpha)
+            self.averages[ticker_ids] = averages
+            if spec.rsi_period is not None:
+                columns.append(relative_strength(averages[:, 0], averages[:, 1]))
+            if spec.macd is not None:
+                fast, slow = averages[:, -2], averages[:, -1]
+                macd = (fast - slow) / slow
+                alpha_signal = 2 / (spec.macd[2] + 1)
+                signal = ema_step(self.signal[ticker_ids], macd, np.array(alpha_signal))
+                self.signal[ticker_ids] = signal
+                columns += [macd, signal, macd - signal]
+        return np.stack(columns, axis=1).astype(np.float32)
+
+
+def with_features(
+    data: Dict[str, pd.DataFrame], engine: Optional[FeatureEngine] = None
+) -> Tuple[Dict[str, pd.DataFrame], FeatureEngine]:
+    """
+    Copies of the daily frames with the `engine.columns` features, and the engine holding their rolling state.
+    Use with `feature_cols=MultiTickerDataset.feature_cols + engine.columns`.
+    """
+    engine = FeatureEngine() if engine is None else engine
+    values, _, offsets = flatten(data)
+    features = engine.transform(values, offsets)
+    out: Dict[str, pd.DataFrame] = {}
+    for ticker_id, (ticker, df) in enumerate(data.items()):
+        block = features[offsets[ticker_id]:offsets[ticker_id + 1]]
+        out[ticker] = df.assign(**{col: block[:, i] for i, col in enumerate(engine.columns)})
+    return out, engine
@@ -0,0 +1,162 @@
+"""
+Daily/weekly/monthly OHLCV bars resampled locally from finer bars, instead of extra
+`TIME_SERIES_WEEKLY`/`TIME_SERIES_MONTHLY` calls per ticker.
+
+All tickers are resampled at once on one contiguous buffer (rows of a ticker are contiguous and sorted,
+`offsets` delimits the tickers, as in `MultiTickerDataset.flat_X`), a bar is a `reduceat` over its rows.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+BAR_COLS = ("open", "high", "low", "close", "adjusted_close", "volume")
+OPEN, HIGH, LOW, CLOSE, ADJUSTED_CLOSE, VOLUME = range(len(BAR_COLS))
+FREQ_NAMES = {"D": "daily", "W": "weekly", "M": "monthly"}
+
+
+def period_ids(dates: np.ndarray, freq: str) -> np.ndarray:
+    """Integer id of the period every timestamp falls into, increasing with time."""
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    if freq == "D":
+        return days
+    if freq == "W":
+        # 1970-01-01 was a Thursday, shifted so weeks start on Monday
+        return (days + 3) // 7
+    if freq == "M":
+        return dates.astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"Unknown frequency {freq!r}, expected one of {list(FREQ_NAMES)}")
+
+
+def resampled_feature_cols(freqs: Sequence[str] = ("W", "M")) -> List[str]:
+    """Bar columns of every frequency, followed by a `<freq>_valid` flag that is 0 while no bar is complete yet."""
+    return [f"{FREQ_NAMES[freq]}_{col}" for freq in freqs for col in (*BAR_COLS, "valid")]
+
+
+def flatten(data: Dict[str, pd.DataFrame]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """`[rows, len(BAR_COLS)]` values, timestamps and per-ticker offsets of `data`, in its key order."""
+    frames = list(data.values())
+    lengths = np.array([len(df) for df in frames], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    if not frames:
+        return np.empty((0, len(BAR_COLS))), np.empty(0, dtype="datetime64[ns]"), offsets
+    values = np.concatenate([df[list(BAR_COLS)].to_numpy(dtype=np.float64) for df in frames])
+    dates = np.concatenate([pd.DatetimeIndex(df.index).values for df in frames])
+    return values, dates, offsets
+
+
+@dataclass
+class Bars:
+    freq: str
+    values: np.ndarray  # [bars, len(BAR_COLS)]
+    period: np.ndarray  # [bars] period id of every bar
+    first_row: np.ndarray  # [bars] first input row aggregated into the bar
+    offsets: np.ndarray  # [tickers + 1] bars of ticker i are offsets[i]:offsets[i + 1]
+
+    def ticker(self, ticker_id: int) -> np.ndarray:
+        return self.values[self.offsets[ticker_id]:self.offsets[ticker_id + 1]]
+
+
+def resample(values: np.ndarray, dates: np.ndarray, offsets: np.ndarray, freq: str) -> Bars:
+    """Aggregates the contiguous rows of every (ticker, period) into one bar: first/max/min/last/last/sum."""
+    period = period_ids(dates, freq)
+    rows = len(period)
+    if rows == 0:
+        return Bars(freq, np.empty((0, len(BAR_COLS))), period, np.empty(0, dtype=np.int64), np.zeros_like(offsets))
+    new_bar = np.empty(rows, dtype=bool)
+    new_bar[0] = True
+    new_bar[1:] = period[1:] != period[:-1]
+    new_bar[offsets[:-1][offsets[:-1] < rows]] = True
+    starts = np.flatnonzero(new_bar)
+    ends = np.append(starts[1:], rows) - 1
+
+    bars = np.empty((len(starts), len(BAR_COLS)), dtype=values.dtype)
+    bars[:, OPEN] = values[starts, OPEN]
+    bars[:, HIGH] = np.maximum.reduceat(values[:, HIGH], starts)
+    bars[:, LOW] = np.minimum.reduceat(values[:, LOW], starts)
+    bars[:, CLOSE] = values[ends, CLOSE]
+    bars[:, ADJUSTED_CLOSE] = values[ends, ADJUSTED_CLOSE]
+    bars[:, VOLUME] = np.add.reduceat(values[:, VOLUME], starts)
+    return Bars(freq, bars, period[starts], starts, np.searchsorted(starts, offsets))
+
+
+def completed_bar_index(bars: Bars, offsets: np.ndarray, rows: int) -> np.ndarray:
+    """
+    For every input row, the last bar of its ticker that was complete before the row's period started,
+    -1 during a ticker's first period. Using only completed bars keeps the features free of lookahead.
+    """
+    current = np.searchsorted(bars.first_row, np.arange(rows), side="right") - 1
+    first_bar = np.repeat(bars.offsets[:-1], np.diff(offsets))
+    previous = current - 1
+    return np.where(previous >= first_bar, previous, -1)
+
+
+def with_resampled_features(data: Dict[str, pd.DataFrame], freqs: Sequence[str] = ("W", "M")) -> Dict[str, pd.DataFrame]:
+    """
+    Copies of the daily frames with the last completed weekly/monthly bar as extra columns
+    (`resampled_feature_cols(freqs)`). During the first period of a ticker there is no such bar,
+    its columns are then 0 and the `<freq>_valid` flag is 0.
+    """
+    values, dates, offsets = flatten(data)
+    features: List[np.ndarray] = []
+    for freq in freqs:
+        bars = resample(values, dates, offsets, freq)
+        index = completed_bar_index(bars, offsets, len(values))
+        valid = index >= 0
+        features += [np.where(valid[:, None], bars.values[index], 0.0), valid[:, None]]
+    stacked = np.concatenate(features, axis=1).astype(np.float32) if features else np.empty((len(values), 0))
+    columns = resampled_feature_cols(freqs)
+    out: Dict[str, pd.DataFrame] = {}
+    for ticker_id, (ticker, df) in enumerate(data.items()):
+        block = stacked[offsets[ticker_id]:offsets[ticker_id + 1]]
+        out[ticker] = df.assign(**{col: block[:, i] for i, col in enumerate(columns)})
+    return out
+
+
+class IncrementalResampler:
+    """
+    Keeps the open bar of every ticker and folds new bars into it in O(1) per ticker,
+    `update` takes at most one new bar per ticker, in time order.
+    """
+
+    def __init__(self, num_tickers: int, freq: str):
+        period_ids(np.empty(0, dtype="datetime64[ns]"), freq)  # validates freq
+        self.freq = freq
+        self.period = np.full(num_tickers, -1, dtype=np.int64)
+        self.current = np.full((num_tickers, len(BAR_COLS)), np.nan)
+        self.completed = np.full((num_tickers, len(BAR_COLS)), np.nan)
+
+    @classmethod
+    def from_bars(cls, bars: Bars) -> "IncrementalResampler":
+        """Continues from a batch `resample`, the last bar of every ticker is still open."""
+        num_tickers = len(bars.offsets) - 1
+        resampler = cls(num_tickers, bars.freq)
+        has_bars = np.diff(bars.offsets) > 0
+        last = bars.offsets[1:] - 1
+        resampler.period[has_bars] = bars.period[last[has_bars]]
+        resampler.current[has_bars] = bars.values[last[has_bars]]
+        has_completed = np.diff(bars.offsets) > 1
+        resampler.completed[has_completed] = bars.values[last[has_completed] - 1]
+        return resampler
+
+    def update(self, ticker_ids: np.ndarray, dates: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Folds `values` ([len(ticker_ids), len(BAR_COLS)]) in, returns the tickers and bars that got completed."""
+        period = period_ids(dates, self.freq)
+        rolled = period != self.period[ticker_ids]
+        finished = ticker_ids[rolled & (self.period[ticker_ids] >= 0)]
+        done = self.current[finished].copy()
+        self.completed[finished] = done
+
+        opened = ticker_ids[rolled]
+        self.period[opened] = period[rolled]
+        self.current[opened] = values[rolled]
+
+        ongoing, new = ticker_ids[~rolled], values[~rolled]
+        current = self.current
+        current[ongoing, HIGH] = np.maximum(current[ongoing, HIGH], new[:, HIGH])
+        current[ongoing, LOW] = np.minimum(current[ongoing, LOW], new[:, LOW])
+        current[ongoing, CLOSE] = new[:, CLOSE]
+        current[ongoing, ADJUSTED_CLOSE] = new[:, ADJUSTED_CLOSE]
+        current[ongoing, VOLUME] += new[:, VOLUME]
+        return finished, done
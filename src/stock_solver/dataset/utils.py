@@ -1,22 +1,49 @@
 import os
 from typing import NamedTuple
-from dotenv import load_dotenv
 
 from contextlib import contextmanager
+from functools import lru_cache
 import time
 import logging
 
-from joblib import Memory  # type: ignore
-
-memory = Memory(".alpha_vantage_cache", verbose=0)
+from ..metrics import registry
 
+CACHE_DIR = ".alpha_vantage_cache"
 
 @contextmanager
 def tmark(label: str):
     t0 = time.perf_counter()
     yield
     dt = time.perf_counter() - t0
-    print(f"time [{label}]: {dt:.4f}s")
+    registry.observe("tmark_seconds", dt, label=label)
+    get_logger().debug(f"time [{label}]: {dt:.4f}s")
+
+
+@lru_cache(maxsize=None)
+def load_env() -> None:
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+def _env(name: str) -> str:
+    load_env()
+    try:
+        return os.environ[name]
+    except KeyError:
+        raise KeyError(f"{name} is not set, add it to the environment or the .env file") from None
+
+
+class ALPACA_KEYS(NamedTuple):
+    api: str
+    secret: str
+
+
+def alpha_vantage_api_key() -> str:
+    return _env("ALPHA_VANTAGE_API_KEY")
+
+
+def alpaca_keys() -> ALPACA_KEYS:
+    return ALPACA_KEYS(api=_env("ALPACA_API_KEY"), secret=_env("ALPACA_SECRET_KEY"))
 
 
 class API_KEYS(NamedTuple):
@@ -26,21 +53,18 @@ class API_KEYS(NamedTuple):
 
 
 def api_keys() -> API_KEYS:
-    load_dotenv()
-
-    alpaca_api_key = os.environ["ALPACA_API_KEY"]
-    alpaca_secret_key = os.environ["ALPACA_SECRET_KEY"]
-    alpha_vantage_api_key = os.environ["ALPHA_VANTAGE_API_KEY"]
-
+    alpaca = alpaca_keys()
     return API_KEYS(
-        alpaca_api=alpaca_api_key,
-        alpaca_secret=alpaca_secret_key,
-        alpha_vantage_api=alpha_vantage_api_key,
+        alpaca_api=alpaca.api,
+        alpaca_secret=alpaca.secret,
+        alpha_vantage_api=alpha_vantage_api_key(),
     )
 
 
 def get_logger() -> logging.Logger:
     logger = logging.getLogger('api_logger')
+    if logger.handlers:
+        return logger
     logger.setLevel(logging.DEBUG)
     ch = logging.FileHandler(".logs_cache")
     ch.setLevel(logging.DEBUG)
@@ -0,0 +1,294 @@
+import multiprocessing
+import os
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, TypeAlias
+
+import numpy as np
+import pandas as pd
+import torch
+
+from ..dataset.dataset import MultiTickerDataset
+from ..dataset.apis.alpha_vantage_calls import load_data
+from ..model.model import StockSolver
+from ..model.embeddings import DataEmbedding
+from ..model.helper_modules import EncoderLayer, DecoderLayer, Distillation
+from ..metrics import MetricsRegistry, registry, configure as configure_metrics, instrument_module, profile_trace
+from .metrics import evaluate_predictions
+
+DateRange: TypeAlias = Tuple[pd.Timestamp, pd.Timestamp]
+Fit: TypeAlias = Callable[[MultiTickerDataset, MultiTickerDataset], torch.nn.Module]
+
+parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+parser.add_argument("--dataset_path", type=Path, default=Path(".alpha_vantage_cache", "dataset"),
+                    help="Folder with the exported parquet files and manifest.")
+parser.add_argument("--lookback", type=int, default=96)
+parser.add_argument("--horizon", type=int, default=3)
+parser.add_argument("--train_days", type=int, default=756, help="Trading days in every training window.")
+parser.add_argument("--val_days", type=int, default=126, help="Trading days in every validation window.")
+parser.add_argument("--test_days", type=int, default=63, help="Trading days in every test window.")
+parser.add_argument("--step_days", type=int, default=None, help="Trading days between folds, defaults to --test_days.")
+parser.add_argument("--expanding", action="store_true", help="Grow the training window instead of rolling it.")
+parser.add_argument("--epochs", type=int, default=5)
+parser.add_argument("--batch_size", type=int, default=64)
+parser.add_argument("--lr", type=float, default=1e-4)
+parser.add_argument("--model_dim", type=int, default=128)
+parser.add_argument("--heads", type=int, default=8)
+parser.add_argument("--workers", type=int, default=1, help="Number of folds evaluated in parallel processes.")
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--metrics_path", type=Path, default=None,
+                    help="Records dataset and per-module forward/backward timings to this file on exit. "
+                         "Prometheus text for a .prom suffix, JSONL otherwise.")
+parser.add_argument("--profile", type=Path, default=None,
+                    help="Writes a torch.profiler Chrome trace of the whole run to this file. Use with --workers=1.")
+
+
+@dataclass
+class Fold:
+    index: int
+    train: DateRange
+    val: DateRange
+    test: DateRange
+
+
+@dataclass
+class FoldResult:
+    fold: Fold
+    predictions: np.ndarray  # [N, H]
+    targets: np.ndarray  # [N, H]
+    last_close: np.ndarray  # [N] close on the last lookback day
+    dates: np.ndarray  # [N] last lookback day, the date the forecast is made
+    ticker_ids: np.ndarray  # [N]
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class TrainConfig:
+    epochs: int = 5
+    batch_size: int = 64
+    lr: float = 1e-4
+    model_dim: int = 128
+    heads: int = 8
+    dropout: float = 0.1
+    seed: int = 42
+
+
+def trading_calendar(dataset: MultiTickerDataset) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(np.unique(np.concatenate([d.values for d in dataset.dates])))
+
+
+def walk_forward_folds(
+    calendar: pd.DatetimeIndex,
+    train_days: int,
+    val_days: int,
+    test_days: int,
+    step_days: Optional[int] = None,
+    expanding: bool = False,
+) -> List[Fold]:
+    """Consecutive train/validation/test date ranges, each range is [start, end) over the trading calendar."""
+    step_days = test_days if step_days is None else step_days
+    # one extra day so the end of the last test range is a real trading day
+    bounds = calendar.append(pd.DatetimeIndex([calendar[-1] + pd.Timedelta(days=1)]))
+    folds: List[Fold] = []
+    offset = 0
+    while offset + train_days + val_days + test_days <= len(calendar):
+        train_start = 0 if expanding else offset
+        val_start = offset + train_days
+        test_start = val_start + val_days
+        test_end = test_start + test_days
+        folds.append(Fold(
+            index=len(folds),
+            train=(bounds[train_start], bounds[val_start]),
+            val=(bounds[val_start], bounds[test_start]),
+            test=(bounds[test_start], bounds[test_end]),
+        ))
+        offset += step_days
+    return folds
+
+
+@torch.no_grad()
+def predict(model: torch.nn.Module, dataset: MultiTickerDataset, batch_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    model.eval()
+    loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False)
+    predictions: List[torch.Tensor] = []
+    targets: List[torch.Tensor] = []
+    for (x, enc_marks), (y, dec_marks), ticker_ids in loader:
+        predictions.append(model(x, enc_marks, dec_marks, ticker_ids)[..., 0])
+        targets.append(y)
+    if not predictions:
+        return np.empty((0, dataset.H), np.float32), np.empty((0, dataset.H), np.float32)
+    return torch.cat(predictions).numpy(), torch.cat(targets).numpy()
+
+
+def window_origins(dataset: MultiTickerDataset) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Ticker ids, forecast dates and last observed closes of every window, in dataset order."""
+    ticker_ids = np.fromiter((w.ticker_id for w in dataset.win), dtype=np.int64, count=len(dataset.win))
+    origins = np.fromiter((w.start for w in dataset.win), dtype=np.int64, count=len(dataset.win)) + dataset.L - 1
+    dates = np.empty(len(origins), dtype="datetime64[ns]")
+    last_close = np.empty(len(origins), dtype=np.float32)
+    for ticker_id in np.unique(ticker_ids):
+        mask = ticker_ids == ticker_id
+        dates[mask] = dataset.dates[ticker_id].values[origins[mask]]
+        last_close[mask] = dataset.Y[ticker_id][origins[mask]]
+    return ticker_ids, dates, last_close
+
+
+def fit_stock_solver(train: MultiTickerDataset, val: MultiTickerDataset, config: TrainConfig) -> torch.nn.Module:
+    torch.manual_seed(config.seed)
+    num_features = len(train.feature_cols)
+    model = StockSolver(
+        enc_in=num_features,
+        dec_in=num_features,
+        model_dim=config.model_dim,
+        output_dim=1,
+        num_tickers=len(train.tickers),
+        dropout=config.dropout,
+        max_seq_len=max(train.L, train.H),
+        heads=config.heads,
+    )
+    if registry.enabled:
+        instrument_module(model, (DataEmbedding, EncoderLayer, DecoderLayer, Distillation))
+    optimizer = torch.optim.Adam(model.parameters(), lr=config.lr)
+    loader = torch.utils.data.DataLoader(train, batch_size=config.batch_size, shuffle=True)
+    best_loss, best_state = float("inf"), model.state_dict()
+    for _ in range(config.epochs):
+        model.train()
+        for (x, enc_marks), (y, dec_marks), ticker_ids in loader:
+            optimizer.zero_grad()
+            loss = torch.nn.functional.mse_loss(model(x, enc_marks, dec_marks, ticker_ids)[..., 0], y)
+            loss.backward()  # type: ignore
+            optimizer.step()  # type: ignore
+        if len(val) == 0:
+            continue
+        predictions, targets = predict(model, val, config.batch_size)
+        val_loss = float(np.mean((predictions - targets) ** 2))
+        if val_loss < best_loss:
+            best_loss = val_loss
+            best_state = {k: v.clone() for k, v in model.state_dict().items()}
+    if best_loss < float("inf"):
+        model.load_state_dict(best_state)
+    return model
+
+
+def run_fold(dataset: MultiTickerDataset, fold: Fold, fit: Fit, batch_size: int) -> FoldResult:
+    train = dataset.split_by_date(*fold.train)
+    val = dataset.split_by_date(*fold.val)
+    test = dataset.split_by_date(*fold.test)
+
+    model = fit(train, val)
+    predictions, targets = predict(model, test, batch_size)
+    ticker_ids, dates, last_close = window_origins(test)
+    return FoldResult(fold, predictions, targets, last_close, dates, ticker_ids)
+
+
+def score(results: List[FoldResult], calendar: pd.DatetimeIndex, num_tickers: int) -> Dict[str, float]:
+    """Metrics over the concatenated prediction matrix of `results`, with one row per day of the trading `calendar`."""
+    dates = np.concatenate([r.dates for r in results])
+    return evaluate_predictions(
+        np.concatenate([r.predictions for r in results]),
+        np.concatenate([r.targets for r in results]),
+        np.concatenate([r.last_close for r in results]),
+        calendar.searchsorted(dates),
+        np.concatenate([r.ticker_ids for r in results]),
+        num_dates=len(calendar),
+        num_tickers=num_tickers,
+    )
+
+
+def check_disjoint_tests(folds: List[Fold]):
+    """Overlapping test ranges forecast the same (date, ticker) twice, which a single prediction matrix cannot hold."""
+    ordered = sorted(folds, key=lambda fold: fold.test[0])
+    for previous, fold in zip(ordered, ordered[1:]):
+        if fold.test[0] < previous.test[1]:
+            raise ValueError(
+                f"Test ranges of folds {previous.index} and {fold.index} overlap, "
+                f"step_days has to be at least test_days"
+            )
+
+
+# set in the parent before forking, so every worker reads the same feature buffers
+_worker_dataset: Optional[MultiTickerDataset] = None
+
+
+def _init_worker(threads: int):
+    torch.set_num_threads(threads)
+
+
+def _run_worker_fold(fold: Fold, fit: Fit, batch_size: int) -> Tuple[FoldResult, Optional[MetricsRegistry]]:
+    """
+    Runs `fold` in a worker and returns the metrics it recorded, workers exit without running
+    the atexit flush, the parent merges and writes them instead.
+    """
+    assert _worker_dataset is not None
+    if not registry.enabled:
+        return run_fold(_worker_dataset, fold, fit, batch_size), None
+    # drops what the parent recorded before forking and what the previous fold already returned
+    registry.reset()
+    return run_fold(_worker_dataset, fold, fit, batch_size), registry
+
+
+def run_backtest(
+    dataset: MultiTickerDataset,
+    folds: List[Fold],
+    fit: Fit,
+    batch_size: int = 64,
+    workers: int = 1,
+) -> List[FoldResult]:
+    """
+    Trains and evaluates every fold. With `workers > 1` folds run in forked processes which share
+    the parent's feature buffers copy-on-write, `fit` then has to be picklable (a module level function or partial).
+    """
+    check_disjoint_tests(folds)
+    if workers <= 1:
+        results = [run_fold(dataset, fold, fit, batch_size) for fold in folds]
+    else:
+        global _worker_dataset
+        _worker_dataset = dataset
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker,
+                initargs=(threads,),
+            ) as executor:
+                outputs = list(executor.map(_run_worker_fold, folds, [fit] * len(folds), [batch_size] * len(folds)))
+        finally:
+            _worker_dataset = None
+        results = [result for result, _ in outputs]
+        for _, worker_metrics in outputs:
+            if worker_metrics is not None:
+                registry.merge(worker_metrics)
+
+    calendar = trading_calendar(dataset)
+    for result in results:
+        result.metrics = score([result], calendar, len(dataset.tickers)) if len(result.dates) else {}
+    return results
+
+
+if __name__ == '__main__':
+    from functools import partial
+
+    args = parser.parse_args()
+    configure_metrics(args.metrics_path)
+    dataset = MultiTickerDataset(load_data(args.dataset_path), lookback=args.lookback, horizon=args.horizon)
+    folds = walk_forward_folds(
+        trading_calendar(dataset), args.train_days, args.val_days, args.test_days, args.step_days, args.expanding
+    )
+    config = TrainConfig(
+        epochs=args.epochs, batch_size=args.batch_size, lr=args.lr,
+        model_dim=args.model_dim, heads=args.heads, seed=args.seed,
+    )
+    with profile_trace(args.profile):
+        results = run_backtest(dataset, folds, partial(fit_stock_solver, config=config), args.batch_size, args.workers)
+    for result in results:
+        fold = result.fold
+        metrics = " | ".join(f"{k} {v:.4f}" for k, v in result.metrics.items())
+        print(f"fold {fold.index} test {fold.test[0].date()} - {fold.test[1].date()} | {metrics}")
+    results = [r for r in results if len(r.dates)]
+    if results:
+        overall = score(results, trading_calendar(dataset), len(dataset.tickers))
+        overall = " | ".join(f"{k} {v:.4f}" for k, v in overall.items())
+        print(f"overall | {overall}")
@@ -0,0 +1,99 @@
+from typing import Dict
+
+import numpy as np
+
+
+def mae(predictions: np.ndarray, targets: np.ndarray) -> float:
+    return float(np.nanmean(np.abs(predictions - targets)))
+
+
+def directional_accuracy(predicted_returns: np.ndarray, realized_returns: np.ndarray) -> float:
+    valid = (realized_returns != 0) & ~np.isnan(realized_returns) & ~np.isnan(predicted_returns)
+    hits = np.sign(predicted_returns[valid]) == np.sign(realized_returns[valid])
+    return float(hits.mean()) if hits.size else float("nan")
+
+
+def cross_section(values: np.ndarray, date_ids: np.ndarray, ticker_ids: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    """Scatters flat per-window values into a [dates, tickers] matrix, NaN where a ticker has no window."""
+    matrix = np.full(shape, np.nan, dtype=np.float64)
+    matrix[date_ids, ticker_ids] = values
+    return matrix
+
+
+def cross_sectional_ranks(matrix: np.ndarray) -> np.ndarray:
+    """Ranks every row in [0, 1] ignoring NaNs, NaN entries stay NaN."""
+    valid = ~np.isnan(matrix)
+    # NaNs are sorted last, so the first `count` ranks of every row belong to real values
+    ranks = np.argsort(np.argsort(np.where(valid, matrix, np.inf), axis=1), axis=1).astype(np.float64)
+    count = valid.sum(axis=1, keepdims=True)
+    ranks = ranks / np.maximum(count - 1, 1)
+    return np.where(valid, ranks, np.nan)
+
+
+def information_coefficient(predicted: np.ndarray, realized: np.ndarray) -> np.ndarray:
+    """Spearman correlation between predicted and realized returns for every date (row)."""
+    both = ~np.isnan(predicted) & ~np.isnan(realized)
+    p = cross_sectional_ranks(np.where(both, predicted, np.nan))
+    r = cross_sectional_ranks(np.where(both, realized, np.nan))
+    # dates without forecasts are all NaN, the count keeps their means from dividing by zero
+    count = np.maximum(both.sum(axis=1, keepdims=True), 1)
+    p = p - np.nansum(p, axis=1, keepdims=True) / count
+    r = r - np.nansum(r, axis=1, keepdims=True) / count
+    cov = np.nansum(p * r, axis=1)
+    std = np.sqrt(np.nansum(p * p, axis=1) * np.nansum(r * r, axis=1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where((both.sum(axis=1) > 2) & (std > 0), cov / std, np.nan)
+
+
+def long_short_pnl(predicted: np.ndarray, realized: np.ndarray, quantile: float = 0.2) -> np.ndarray:
+    """Return of an equal-weighted book that is long the top and short the bottom `quantile` of every date."""
+    both = ~np.isnan(predicted) & ~np.isnan(realized)
+    ranks = cross_sectional_ranks(np.where(both, predicted, np.nan))
+    long = both & (ranks >= 1.0 - quantile)
+    short = both & (ranks <= quantile)
+    realized = np.where(both, realized, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        long_ret = (realized * long).sum(axis=1) / long.sum(axis=1)
+        short_ret = (realized * short).sum(axis=1) / short.sum(axis=1)
+    pnl = long_ret - short_ret
+    return np.where(long.any(axis=1) & short.any(axis=1), pnl, np.nan)
+
+
+def evaluate_predictions(
+    predictions: np.ndarray,
+    targets: np.ndarray,
+    last_close: np.ndarray,
+    date_ids: np.ndarray,
+    ticker_ids: np.ndarray,
+    num_dates: int,
+    num_tickers: int,
+    quantile: float = 0.2,
+) -> Dict[str, float]:
+    """
+    Error and trading metrics over the full prediction matrix.
+    `predictions` and `targets` are [N, H] closes, returns are measured from `last_close` to the end of the horizon.
+    `date_ids` are positions in the trading calendar, so the `num_dates` rows are consecutive trading days
+    even where no window was forecasted.
+    The H-day returns of consecutive dates overlap, the book is therefore only rebalanced every H trading days
+    from the first forecasted date and its Sharpe ratio is annualized with 252 / H periods per year.
+    """
+    horizon = predictions.shape[1]
+    predicted_returns = predictions[:, -1] / last_close - 1.0
+    realized_returns = targets[:, -1] / last_close - 1.0
+
+    shape = (num_dates, num_tickers)
+    predicted = cross_section(predicted_returns, date_ids, ticker_ids, shape)
+    realized = cross_section(realized_returns, date_ids, ticker_ids, shape)
+    ic = information_coefficient(predicted, realized)
+    rebalance = slice(int(date_ids.min()) if len(date_ids) else 0, None, horizon)
+    pnl = long_short_pnl(predicted[rebalance], realized[rebalance], quantile)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = np.nanmean(pnl) / np.nanstd(pnl) * np.sqrt(252 / horizon) if np.any(~np.isnan(pnl)) else np.nan
+    return {
+        "mae": mae(predictions, targets),
+        "directional_accuracy": directional_accuracy(predicted_returns, realized_returns),
+        "ic": float(np.nanmean(ic)) if np.any(~np.isnan(ic)) else float("nan"),
+        "long_short_pnl": float(np.nansum(pnl)),
+        "long_short_sharpe": float(sharpe),
+    }
@@ -0,0 +1,216 @@
+import atexit
+import json
+import time
+import warnings
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Deque, Dict, Generator, Iterable, List, Optional, Tuple, TypeAlias
+
+Labels: TypeAlias = Tuple[Tuple[str, str], ...]
+Key: TypeAlias = Tuple[str, Labels]
+
+SAMPLES_PER_SERIES = 10_000  # most recent observations kept per series for quantiles
+QUANTILES = (0.5, 0.9, 0.99)
+DISABLED_TIMER = nullcontext()
+
+
+class Summary:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.samples: Deque[float] = deque(maxlen=SAMPLES_PER_SERIES)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def merge(self, other: "Summary"):
+        self.count += other.count
+        self.sum += other.sum
+        self.samples.extend(other.samples)
+
+    def quantiles(self, qs: Iterable[float] = QUANTILES) -> Dict[float, float]:
+        import numpy as np
+
+        if not self.samples:
+            return {q: float("nan") for q in qs}
+        values = np.quantile(np.fromiter(self.samples, dtype=np.float64), list(qs))
+        return dict(zip(qs, values.tolist()))
+
+
+class MetricsRegistry:
+    """
+    Process local counters and summaries. Recording is a no-op until the registry is enabled,
+    so the instrumented hot paths cost a single attribute check by default.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.counters: Dict[Key, float] = {}
+        self.summaries: Dict[Key, Summary] = {}
+        self.sink: Optional[Path] = None
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> Key:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any):
+        if not self.enabled:
+            return
+        key = MetricsRegistry._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any):
+        if not self.enabled:
+            return
+        key = MetricsRegistry._key(name, labels)
+        summary = self.summaries.get(key)
+        if summary is None:
+            summary = self.summaries[key] = Summary()
+        summary.observe(value)
+
+    def timer(self, name: str, **labels: Any) -> ContextManager[None]:
+        if not self.enabled:
+            return DISABLED_TIMER
+        return self._timer(name, labels)
+
+    @contextmanager
+    def _timer(self, name: str, labels: Dict[str, Any]) -> Generator[None, None, None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def summary(self, name: str, **labels: Any) -> Optional[Summary]:
+        return self.summaries.get(MetricsRegistry._key(name, labels))
+
+    def reset(self):
+        self.counters.clear()
+        self.summaries.clear()
+
+    def merge(self, other: "MetricsRegistry"):
+        """Adds the counters and observations of `other`, e.g. a registry recorded in a worker process."""
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0.0) + value
+        for key, summary in other.summaries.items():
+            self.summaries.setdefault(key, Summary()).merge(summary)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        for (name, labels), value in self.counters.items():
+            rows.append({"name": name, "labels": dict(labels), "type": "counter", "value": value})
+        for (name, labels), summary in self.summaries.items():
+            rows.append({
+                "name": name, "labels": dict(labels), "type": "summary",
+                "count": summary.count, "sum": summary.sum,
+                "quantiles": {str(q): v for q, v in summary.quantiles().items()},
+            })
+        return rows
+
+    def to_prometheus(self) -> str:
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines: List[str] = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{fmt(labels)} {value}")
+        for (name, labels), summary in sorted(self.summaries.items(), key=lambda item: item[0]):
+            for q, v in summary.quantiles().items():
+                lines.append(f"{name}{fmt(labels, (('quantile', str(q)),))} {v}")
+            lines.append(f"{name}_sum{fmt(labels)} {summary.sum}")
+            lines.append(f"{name}_count{fmt(labels)} {summary.count}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self, path: Optional[Path] = None):
+        """Writes the metrics to `path` (or the configured sink): Prometheus text for `.prom`, appended JSONL otherwise."""
+        path = self.sink if path is None else path
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == ".prom":
+            path.write_text(self.to_prometheus(), encoding="utf-8")
+            return
+        timestamp = time.time()
+        with open(path, "a", encoding="utf-8") as file:
+            for row in self.snapshot():
+                file.write(json.dumps({"time": timestamp, **row}) + "\n")
+
+
+registry = MetricsRegistry()
+# torch warns about it on every backward pass and attributes it to the caller, so it is matched by message
+HOOK_WARNING = "Full backward hook is firing when gradients are computed"
+
+
+def configure(path: Optional[Path]):
+    """Enables recording and flushes to `path` when the process exits. `None` keeps metrics disabled."""
+    if path is None:
+        return
+    registry.enabled = True
+    if registry.sink is None:
+        atexit.register(registry.flush)
+    registry.sink = path
+
+
+def instrument_module(model: Any, module_types: Tuple[type, ...], prefix: str = "") -> List[Any]:
+    """
+    Records forward and backward wall time of every submodule of `model` that is an instance of `module_types`.
+    Returns the hook handles, call `.remove()` on them to uninstrument.
+    """
+    # embeddings have no inputs requiring grad, their backward time is then measured w.r.t. outputs, which is fine.
+    # The warning is raised during backward, outside of this call, so it cannot be scoped to it
+    if not any(action == "ignore" and message is not None and message.pattern == HOOK_WARNING
+               for action, message, *_ in warnings.filters):
+        warnings.filterwarnings("ignore", message=HOOK_WARNING)
+    handles: List[Any] = []
+    for name, module in model.named_modules(prefix=prefix):
+        if not isinstance(module, module_types):
+            continue
+        starts: Dict[str, float] = {}
+
+        def forward_pre(module: Any, inputs: Any, starts: Dict[str, float] = starts):
+            starts["forward"] = time.perf_counter()
+
+        def forward_post(module: Any, inputs: Any, output: Any, name: str = name, starts: Dict[str, float] = starts):
+            registry.observe("module_forward_seconds", time.perf_counter() - starts["forward"], module=name)
+
+        def backward_pre(module: Any, grad_output: Any, starts: Dict[str, float] = starts):
+            starts["backward"] = time.perf_counter()
+
+        def backward_post(
+            module: Any, grad_input: Any, grad_output: Any, name: str = name, starts: Dict[str, float] = starts
+        ):
+            if "backward" in starts:
+                registry.observe("module_backward_seconds", time.perf_counter() - starts.pop("backward"), module=name)
+
+        handles.append(module.register_forward_pre_hook(forward_pre))
+        handles.append(module.register_forward_hook(forward_post))
+        handles.append(module.register_full_backward_pre_hook(backward_pre))
+        handles.append(module.register_full_backward_hook(backward_post))
+    return handles
+
+
+def profile_trace(path: Optional[Path]) -> ContextManager[Any]:
+    """`torch.profiler` over the enclosed block, exported as a Chrome trace to `path`. No-op when `path` is None."""
+    if path is None:
+        return nullcontext()
+    import torch.profiler
+
+    @contextmanager
+    def trace() -> Generator[Any, None, None]:
+        with torch.profiler.profile(
+            activities=[torch.profiler.ProfilerActivity.CPU],
+            record_shapes=True,
+            profile_memory=True,
+            with_stack=False,
+        ) as profiler:
+            yield profiler
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.export_chrome_trace(str(path))
+
+    return trace()
@@ -1,5 +1,6 @@
 import torch
 import math
+from typing import Optional
 
 class ProbSparseAttention(torch.nn.Module):
     def __init__(self, factor: float, dropout: float = 0.1, eps: float = 1e-9):
@@ -9,25 +10,41 @@ class ProbSparseAttention(torch.nn.Module):
         self.dropout = torch.nn.Dropout(dropout)
         self.eps = eps
 
-    def forward(self, Q: torch.Tensor, K: torch.Tensor, V: torch.Tensor) -> torch.Tensor:
+    def forward(
+            self,
+            Q: torch.Tensor,
+            K: torch.Tensor,
+            V: torch.Tensor,
+            mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        """`mask` is a boolean [B*heads or 1, L_q or 1, L_k] tensor, True where a query must not attend to a key."""
         _, L_q, dim = Q.shape
         
         scores = get_scores(Q, K, dim)
-        M = get_sparsity_measure(scores)
+        if mask is not None:
+            mask = mask.expand(Q.shape[0], L_q, K.shape[1])
+        M = get_sparsity_measure(scores, mask)
 
         top_idx = get_topk_queries(L_q, M, self.factor, self.eps)
         top_idx_exp = top_idx.unsqueeze(-1).expand(-1, -1, dim)
         Q_sparse = torch.gather(Q, dim=1, index=top_idx_exp)
 
         scores_sparse = get_scores(Q_sparse, K, dim)
+        if mask is not None:
+            top_mask = torch.gather(mask, dim=1, index=top_idx.unsqueeze(-1).expand(-1, -1, K.shape[1]))
+            scores_sparse = scores_sparse.masked_fill(top_mask, torch.finfo(scores_sparse.dtype).min)
 
         attention = torch.softmax(scores_sparse, dim=-1)
         attention = self.dropout(attention)
 
         context_sparse = attention @ V
-        V_mean = V.mean(dim=1, keepdim=True)
-
-        context = V_mean.expand(-1, L_q, -1).clone()
+        if mask is None:
+            V_mean = V.mean(dim=1, keepdim=True)
+            context = V_mean.expand(-1, L_q, -1).clone()
+        else:
+            # lazy queries take the mean of the values they may attend to, e.g. the running mean under a causal mask
+            allowed = (~mask).to(V.dtype)
+            context = (allowed @ V) / allowed.sum(dim=-1, keepdim=True).clamp(min=1)
         context.scatter_(1, top_idx_exp, context_sparse)
 
         return context
@@ -44,27 +61,54 @@ class AttentionLayer(torch.nn.Module):
         self.out = torch.nn.Linear(dim, dim)
         self.drop = torch.nn.Dropout(proj_dropout)
     
-    def project(self, projection: torch.nn.Linear, x: torch.Tensor) -> torch.Tensor:
+    def project(self, projection: torch.nn.Module, x: torch.Tensor) -> torch.Tensor:
         B, L, _ = x.shape
         matrix: torch.Tensor = projection(x).view(B, L, self.heads, self.dh)
         matrix = matrix.permute(0, 2, 1, 3).contiguous().view(B*self.heads, L, self.dh)
         return matrix
 
-    def forward(self, x: torch.Tensor):
-        B, L, D = x.shape
-        Q = self.project(self.Q_proj, x)
-        K = self.project(self.K_proj, x)
-        V = self.project(self.V_proj, x)
-
-        context: torch.Tensor = self.prob_attention(Q, K, V)
+    def forward(
+            self,
+            queries: torch.Tensor,
+            keys: Optional[torch.Tensor] = None,
+            values: Optional[torch.Tensor] = None,
+            key_padding_mask: Optional[torch.Tensor] = None,
+            attn_mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        """
+        Masks follow `torch.nn.MultiheadAttention`: `key_padding_mask` is a boolean [B, L_k] and `attn_mask`
+        a boolean [L_q, L_k] tensor, True marks the keys a query must not attend to.
+        """
+        # self-attention when keys/values are omitted, cross-attention otherwise
+        keys = queries if keys is None else keys
+        values = keys if values is None else values
+        B, L, D = queries.shape
+        Q = self.project(self.Q_proj, queries)
+        K = self.project(self.K_proj, keys)
+        V = self.project(self.V_proj, values)
+
+        mask = None
+        if attn_mask is not None:
+            mask = attn_mask.unsqueeze(0)
+        if key_padding_mask is not None:
+            # rows of Q, K and V are ordered (batch, head)
+            padding = key_padding_mask.unsqueeze(1).repeat_interleave(self.heads, dim=0)
+            mask = padding if mask is None else mask | padding
+        context: torch.Tensor = self.prob_attention(Q, K, V, mask)
         context = context.view(B, self.heads, L, self.dh)
         context = context.permute(0, 2, 1, 3).contiguous().view(B, L, D)
 
         return self.drop(self.out(context))
 
-def get_sparsity_measure(scores: torch.Tensor) -> torch.Tensor:
-    M_max, _ = scores.max(dim=-1)
-    M_mean = scores.mean(dim=-1)
+def get_sparsity_measure(scores: torch.Tensor, mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+    if mask is None:
+        M_max, _ = scores.max(dim=-1)
+        M_mean = scores.mean(dim=-1)
+        return M_max - M_mean
+    # masked keys take no part in ranking the queries
+    M_max, _ = scores.masked_fill(mask, float("-inf")).max(dim=-1)
+    allowed = (~mask).sum(dim=-1).clamp(min=1)
+    M_mean = scores.masked_fill(mask, 0.0).sum(dim=-1) / allowed
     return M_max - M_mean
 
 def get_scores(Q: torch.Tensor, K: torch.Tensor, dim: int) -> torch.Tensor:
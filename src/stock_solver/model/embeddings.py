@@ -27,6 +27,9 @@ class TickerEmbedding(torch.nn.Module):
     def forward(self, ticker_ids: torch.Tensor, length: int) -> torch.Tensor:
         embedding = self.embedding(ticker_ids.long())
         embedding = embedding.unsqueeze(1).expand(-1, length, -1) # [B, L, D]
+        if not self.training:
+            # stays a broadcast view, dropout is the only thing that would materialize it
+            return embedding
         return self.drop(embedding)
 
 
@@ -43,8 +46,13 @@ class ValueEmbedding(torch.nn.Module):
         torch.nn.init.kaiming_uniform_(self.layer.weight)
     
     def forward(self, x: torch.Tensor) -> torch.Tensor:
-        # [B, L, in] -> [B, in, L] -> conv -> [B, out, L] -> [B, L, out]
-        return self.layer(x.transpose(1, 2)).transpose(1, 2)
+        # Channels-last circular conv: pad along L, unfold the kernel windows and apply
+        # the conv as a single matmul, [B, L, in] -> [B, L, in * k] -> [B, L, out]
+        k, p = self.layer.kernel_size[0], self.layer.padding[0]
+        assert isinstance(p, int)
+        x = torch.cat([x[:, x.size(1) - p:], x, x[:, :p]], dim=1)
+        windows = x.unfold(1, k, 1).flatten(2)
+        return torch.nn.functional.linear(windows, self.layer.weight.flatten(1), self.layer.bias)
 
 
 class TemporalEmbedding(torch.nn.Module):
@@ -55,8 +63,35 @@ class TemporalEmbedding(torch.nn.Module):
         self.emb_weekday = torch.nn.Embedding(7, model_dim)
         
         self.dropout = torch.nn.Dropout(dropout)
+        self._fused: torch.Tensor | None = None
+        self._fused_ptrs: tuple[int, ...] = ()
+        self.register_load_state_dict_post_hook(lambda module, _: module.invalidate())
+
+    @staticmethod
+    def mark_ids(x: torch.Tensor) -> torch.Tensor:
+        # [..., (month, day, weekday)] -> [...] row of the combined table
+        return (x[..., 0] * 32 + x[..., 1]) * 7 + x[..., 2]
+
+    def invalidate(self):
+        """Drops the fused table, needed after weights were changed in place under `torch.no_grad()`."""
+        self._fused = None
+
+    def fused_table(self) -> torch.Tensor:
+        # every (month, day, weekday) sum precomputed. Weights only change after a differentiable
+        # forward (which drops the table) or `load_state_dict`, moving them changes their storage
+        weights = (self.emb_month.weight, self.emb_day.weight, self.emb_weekday.weight)
+        ptrs = tuple(w.data_ptr() for w in weights)
+        if self._fused is None or ptrs != self._fused_ptrs:
+            month, day, weekday = (w.detach() for w in weights)
+            self._fused = (month[:, None, None] + day[None, :, None] + weekday[None, None, :]).flatten(0, 2)
+            self._fused_ptrs = ptrs
+        return self._fused
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
+        # the fused table is a constant, only used when no gradient has to reach the weights
+        if not self.training and not torch.is_grad_enabled():
+            return torch.nn.functional.embedding(TemporalEmbedding.mark_ids(x), self.fused_table())
+        self.invalidate()
         month = self.emb_month(x[..., 0])
         day = self.emb_day(x[..., 1])
         weekday = self.emb_weekday(x[..., 2])
@@ -92,10 +127,9 @@ class DataEmbedding(torch.nn.Module):
     
     def forward(self, x: torch.Tensor, ticker_ids: torch.Tensor, x_marks: torch.Tensor) -> torch.Tensor:
         L = x.size(1)
-        out = (
-            self.positional_embedding(x)
-            + self.value_embedding(x)
-            + self.ticker_embedding(ticker_ids, L)
-            + self.temporal_embedding(x_marks)
-        )
+        # the value embedding allocates the output, the rest is accumulated into it in place
+        out = self.value_embedding(x)
+        out += self.positional_embedding(x)
+        out += self.ticker_embedding(ticker_ids, L)
+        out += self.temporal_embedding(x_marks)
         return out
\ No newline at end of file
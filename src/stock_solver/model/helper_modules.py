@@ -1,5 +1,9 @@
-from typing import Optional
+from typing import Literal, Optional, TypeAlias, cast
 import torch
+import torch.utils.checkpoint
+
+FFNType: TypeAlias = Literal["conv", "linear"]
+
 
 class FFN(torch.nn.Module):
     def __init__(self, model_dim: int, hidden_dim: int, dropout: float):
@@ -15,6 +19,45 @@ class FFN(torch.nn.Module):
         return self.layers(x.transpose(1, 2)).transpose(1, 2)
 
 
+class LinearFFN(torch.nn.Module):
+    """Same computation as `FFN` with `Linear` layers, so dynamic int8 quantization applies to it."""
+
+    def __init__(self, model_dim: int, hidden_dim: int, dropout: float):
+        super().__init__() # type: ignore
+        self.layers = torch.nn.Sequential(
+            torch.nn.Linear(model_dim, hidden_dim),
+            torch.nn.ReLU(),
+            torch.nn.Dropout(dropout),
+            torch.nn.Linear(hidden_dim, model_dim),
+        )
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.layers(x)
+
+    @classmethod
+    def from_conv(cls, ffn: FFN) -> "LinearFFN":
+        conv_in, _, dropout, conv_out = ffn.layers
+        assert isinstance(conv_in, torch.nn.Conv1d) and isinstance(conv_out, torch.nn.Conv1d)
+        assert isinstance(dropout, torch.nn.Dropout)
+        linear_ffn = cls(conv_in.in_channels, conv_in.out_channels, dropout.p)
+        linear_in, _, _, linear_out = linear_ffn.layers
+        with torch.no_grad():
+            # 1x1 conv weights are [out, in, 1], linear weights are [out, in]
+            linear_in.weight.copy_(conv_in.weight.squeeze(-1))
+            linear_out.weight.copy_(conv_out.weight.squeeze(-1))
+            if conv_in.bias is not None:
+                linear_in.bias.copy_(conv_in.bias)
+            if conv_out.bias is not None:
+                linear_out.bias.copy_(conv_out.bias)
+        return linear_ffn.train(ffn.training)
+
+
+def build_ffn(ffn_type: FFNType, model_dim: int, hidden_dim: int, dropout: float) -> torch.nn.Module:
+    if ffn_type == "linear":
+        return LinearFFN(model_dim, hidden_dim, dropout)
+    return FFN(model_dim, hidden_dim, dropout)
+
+
 class Distillation(torch.nn.Module):
     def __init__(self, model_dim: int):
         super().__init__() # type: ignore
@@ -30,12 +73,21 @@ class Distillation(torch.nn.Module):
 
 
 class EncoderLayer(torch.nn.Module):
-    def __init__(self, attention: torch.nn.Module, model_dim: int, hidden_dim: int, dropout: float):
+    def __init__(
+            self,
+            attention: torch.nn.Module,
+            model_dim: int,
+            hidden_dim: int,
+            dropout: float,
+            ffn_type: FFNType = "conv",
+            checkpoint: bool = False
+        ):
         super().__init__() # type: ignore
+        self.checkpoint = checkpoint
         self.attention = attention
         self.dropout = torch.nn.Dropout(dropout)
         self.norm1 = torch.nn.LayerNorm(model_dim)
-        self.ffn = FFN(model_dim, hidden_dim, dropout)
+        self.ffn = build_ffn(ffn_type, model_dim, hidden_dim, dropout)
         self.norm2 = torch.nn.LayerNorm(model_dim)
 
     def forward(
@@ -44,7 +96,20 @@ class EncoderLayer(torch.nn.Module):
             key_padding_mask: Optional[torch.Tensor] = None,
             attn_mask: Optional[torch.Tensor] = None
     ) -> torch.Tensor:
-        attn_out = self.attention(x, key_padding_mask, attn_mask)
+        if self.checkpoint and self.training and torch.is_grad_enabled():
+            # activations are recomputed during backward instead of being kept alive
+            return cast(torch.Tensor, torch.utils.checkpoint.checkpoint(
+                self._forward, x, key_padding_mask, attn_mask, use_reentrant=False
+            ))
+        return self._forward(x, key_padding_mask, attn_mask)
+
+    def _forward(
+            self,
+            x: torch.Tensor,
+            key_padding_mask: Optional[torch.Tensor] = None,
+            attn_mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        attn_out = self.attention(x, key_padding_mask=key_padding_mask, attn_mask=attn_mask)
         x = self.norm1(x + self.dropout(attn_out))
         y = self.ffn(x)
         x = self.norm2(x + y)
@@ -58,17 +123,20 @@ class DecoderLayer(torch.nn.Module):
             cross_attention: torch.nn.Module,
             model_dim: int,
             hidden_dim: int,
-            dropout: float
+            dropout: float,
+            ffn_type: FFNType = "conv",
+            checkpoint: bool = False
         ):
         super().__init__() # type: ignore
 
+        self.checkpoint = checkpoint
         self.cross_attention = cross_attention
         self.attention = self_attention
         self.dropout= torch.nn.Dropout(dropout)
         self.norm1 = torch.nn.LayerNorm(model_dim)
         self.norm2 = torch.nn.LayerNorm(model_dim)
         self.norm3 = torch.nn.LayerNorm(model_dim)
-        self.ffn = FFN(model_dim=model_dim, hidden_dim=hidden_dim, dropout=dropout)
+        self.ffn = build_ffn(ffn_type, model_dim=model_dim, hidden_dim=hidden_dim, dropout=dropout)
 
     def forward(
             self,
@@ -78,6 +146,21 @@ class DecoderLayer(torch.nn.Module):
             encoder_padding_mask: Optional[torch.Tensor] = None,
             causal_mask: Optional[torch.Tensor] = None
         ) -> torch.Tensor:
+        masks = (key_padding_mask, encoder_padding_mask, causal_mask)
+        if self.checkpoint and self.training and torch.is_grad_enabled():
+            return cast(torch.Tensor, torch.utils.checkpoint.checkpoint(
+                self._forward, x, encoder_out, *masks, use_reentrant=False
+            ))
+        return self._forward(x, encoder_out, *masks)
+
+    def _forward(
+            self,
+            x: torch.Tensor,
+            encoder_out: torch.Tensor,
+            key_padding_mask: Optional[torch.Tensor] = None,
+            encoder_padding_mask: Optional[torch.Tensor] = None,
+            causal_mask: Optional[torch.Tensor] = None
+        ) -> torch.Tensor:
         dec_attn = self.attention(x, x, x, key_padding_mask, causal_mask)
         x = self.norm1(x + self.dropout(dec_attn))
         cross_attn = self.cross_attention(x, encoder_out, encoder_out, encoder_padding_mask)
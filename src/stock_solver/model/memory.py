@@ -0,0 +1,110 @@
+import copy
+from typing import Dict, List, Tuple
+
+import torch
+
+from .attentions import AttentionLayer
+from .helper_modules import EncoderLayer, DecoderLayer
+from .model import StockSolver
+
+FLOAT_BYTES = 4
+# parameter, gradient and the two Adam moments
+PARAMETER_COPIES = 4
+
+
+def _synthetic_batch(model: StockSolver, batch_size: int, lookback: int, horizon: int):
+    enc_in = model.enc_embedding.value_embedding.layer.in_channels
+    x = torch.randn(batch_size, lookback, enc_in)
+    # (month, day, weekday) = (1, 1, 0) is a valid mark for all three tables
+    enc_marks = torch.tensor([1, 1, 0]).expand(batch_size, lookback, 3)
+    dec_marks = torch.tensor([1, 1, 0]).expand(batch_size, horizon, 3)
+    ticker_ids = torch.zeros(batch_size, dtype=torch.int64)
+    return x, enc_marks, dec_marks, ticker_ids
+
+
+def activation_profile(
+    model: StockSolver, lookback: int, horizon: int, batch_size: int = 2
+) -> Tuple[int, List[int], List[int]]:
+    """
+    Runs one training forward pass without checkpointing and measures the bytes autograd keeps alive for backward.
+    Returns the total, the bytes saved inside every encoder/decoder layer and the bytes of their inputs.
+    The pass runs on a copy, so the batch norm statistics and the mode of `model` stay untouched.
+    """
+    model = copy.deepcopy(model)
+    layers = [m for m in model.modules() if isinstance(m, (EncoderLayer, DecoderLayer))]
+    # weights are accounted for by `parameter_bytes`
+    seen = {t.untyped_storage().data_ptr() for t in (*model.parameters(), *model.buffers())}
+    saved = 0
+    # saved tensors of discarded branches are freed during forward, and a later storage at the same
+    # address would be skipped, so everything packed stays alive until the pass is done
+    packed: List[torch.Tensor] = []
+    layer_saved: Dict[int, int] = {}
+    layer_inputs: Dict[int, int] = {}
+
+    def pack(tensor: torch.Tensor) -> torch.Tensor:
+        nonlocal saved
+        storage = tensor.untyped_storage()
+        packed.append(tensor)
+        if storage.data_ptr() not in seen:
+            seen.add(storage.data_ptr())
+            saved += storage.nbytes()
+        return tensor
+
+    def pre_hook(module: torch.nn.Module, inputs: Tuple[torch.Tensor, ...]):
+        layer_saved[id(module)] = saved
+        layer_inputs[id(module)] = inputs[0].nbytes
+
+    def post_hook(module: torch.nn.Module, inputs: Tuple[torch.Tensor, ...], output: torch.Tensor):
+        layer_saved[id(module)] = saved - layer_saved[id(module)]
+
+    for layer in layers:
+        layer.register_forward_pre_hook(pre_hook)
+        layer.register_forward_hook(post_hook)
+        layer.checkpoint = False
+    model.train()
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        model(*_synthetic_batch(model, batch_size, lookback, horizon))
+    return saved, [layer_saved[id(layer)] for layer in layers], [layer_inputs[id(layer)] for layer in layers]
+
+
+def estimate_sample_bytes(model: StockSolver, lookback: int, horizon: int) -> int:
+    """
+    Bytes of activations a single training sample needs, including the transient attention scores.
+    Encoder/decoder layers with `checkpoint` set only keep their inputs alive.
+    """
+    batch_size = 2
+    total, layer_saved, layer_inputs = activation_profile(model, lookback, horizon, batch_size)
+    layers = [m for m in model.modules() if isinstance(m, (EncoderLayer, DecoderLayer))]
+    checkpointed = [i for i, layer in enumerate(layers) if layer.checkpoint]
+    if checkpointed:
+        # inputs of checkpointed layers stay alive, and one of them at a time is recomputed during backward
+        total -= sum(layer_saved[i] - layer_inputs[i] for i in checkpointed)
+        total += max(layer_saved[i] for i in checkpointed)
+    heads = max((m.heads for m in model.modules() if isinstance(m, AttentionLayer)), default=1)
+    # full [L, L] scores for the sparsity measure are never saved but exist during forward
+    scores = 2 * heads * lookback * lookback * FLOAT_BYTES
+    return total // batch_size + scores
+
+
+def parameter_bytes(model: torch.nn.Module) -> int:
+    return PARAMETER_COPIES * sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+def autotune_batch_size(
+    model: StockSolver,
+    lookback: int,
+    horizon: int,
+    memory_budget: int,
+    safety: float = 1.25,
+    max_batch_size: int = 65536,
+) -> int:
+    """Largest batch size whose training step fits into `memory_budget` bytes, with the layers' checkpointing."""
+    available = memory_budget - parameter_bytes(model)
+    per_sample = safety * estimate_sample_bytes(model, lookback, horizon)
+    batch_size = min(max_batch_size, int(available // per_sample))
+    if batch_size < 1:
+        raise ValueError(
+            f"Memory budget of {memory_budget / 2**30:.2f}GiB does not fit a single sample "
+            f"({per_sample / 2**20:.1f}MiB per sample, {parameter_bytes(model) / 2**20:.1f}MiB of parameters)"
+        )
+    return batch_size
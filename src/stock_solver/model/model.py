@@ -1,14 +1,26 @@
 import torch
 import argparse
 from .embeddings import DataEmbedding
+from .attentions import AttentionLayer
+from .helper_modules import EncoderLayer, DecoderLayer, Distillation, FFNType
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--batch_size", default=10, type=int)
 parser.add_argument("--epochs", default=10, type=int)
 parser.add_argument("--seed", default=42, type=int)
+parser.add_argument("--lookback", default=96, type=int)
+parser.add_argument("--horizon", default=3, type=int)
+parser.add_argument("--features", default=5, type=int)
+parser.add_argument("--num_tickers", default=2000, type=int)
+parser.add_argument("--model_dim", default=128, type=int)
+parser.add_argument("--heads", default=8, type=int)
+parser.add_argument("--checkpoint_layers", action="store_true",
+                    help="Recompute encoder/decoder layer activations during backward to save memory.")
+parser.add_argument("--memory_budget", default=None, type=float,
+                    help="RAM budget in GiB. Overrides --batch_size with the largest batch that fits.")
 
 
-class StockSolver(torch.nn.Module):    
+class StockSolver(torch.nn.Module):
     def __init__(
             self,
             enc_in: int,
@@ -18,15 +30,82 @@ class StockSolver(torch.nn.Module):
             num_tickers: int,
             dropout: float,
             max_seq_len: int,
+            heads: int = 8,
+            factor: float = 5.0,
+            hidden_dim: int = 512,
+            enc_layers: int = 2,
+            dec_layers: int = 1,
+            ffn_type: FFNType = "conv",
+            checkpoint_layers: bool = False,
         ) -> None:
         super().__init__() # type: ignore
+        self.dec_in = dec_in
 
         self.enc_embedding = DataEmbedding(enc_in, model_dim, num_tickers, dropout, max_seq_len)
         self.dec_embedding = DataEmbedding(dec_in, model_dim, num_tickers, dropout, max_seq_len)
-        
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
-        return x
+        self.encoder = torch.nn.ModuleList([
+            EncoderLayer(
+                AttentionLayer(model_dim, heads, factor, dropout, dropout),
+                model_dim, hidden_dim, dropout, ffn_type, checkpoint_layers
+            )
+            for _ in range(enc_layers)
+        ])
+        # distilling halves the sequence between consecutive encoder layers
+        self.distillations = torch.nn.ModuleList([Distillation(model_dim) for _ in range(enc_layers - 1)])
+        self.encoder_norm = torch.nn.LayerNorm(model_dim)
+
+        self.decoder = torch.nn.ModuleList([
+            DecoderLayer(
+                AttentionLayer(model_dim, heads, factor, dropout, dropout),
+                AttentionLayer(model_dim, heads, factor, dropout, dropout),
+                model_dim, hidden_dim, dropout, ffn_type, checkpoint_layers
+            )
+            for _ in range(dec_layers)
+        ])
+        self.decoder_norm = torch.nn.LayerNorm(model_dim)
+        self.projection = torch.nn.Linear(model_dim, output_dim)
+
+    def encode(self, x: torch.Tensor, enc_marks: torch.Tensor, ticker_ids: torch.Tensor) -> torch.Tensor:
+        out = self.enc_embedding(x, ticker_ids, enc_marks.long())
+        for i, layer in enumerate(self.encoder):
+            out = layer(out)
+            if i < len(self.distillations):
+                out = self.distillations[i](out)
+        return self.encoder_norm(out)
+
+    def forward(
+            self,
+            x: torch.Tensor,
+            enc_marks: torch.Tensor,
+            dec_marks: torch.Tensor,
+            ticker_ids: torch.Tensor
+        ) -> torch.Tensor:
+        encoder_out = self.encode(x, enc_marks, ticker_ids)
+
+        # the decoder only knows the calendar of the forecast horizon, values are zero placeholders
+        B, H = dec_marks.shape[:2]
+        dec_x = x.new_zeros(B, H, self.dec_in)
+        out = self.dec_embedding(dec_x, ticker_ids, dec_marks.long())
+        for layer in self.decoder:
+            out = layer(out, encoder_out)
+        return self.projection(self.decoder_norm(out)) # [B, H, output_dim]
 
 if __name__ == '__main__':
-    args = parser.parse_args([] if  "__file__" not in globals() else None)
\ No newline at end of file
+    args = parser.parse_args([] if  "__file__" not in globals() else None)
+    torch.manual_seed(args.seed)
+    model = StockSolver(
+        enc_in=args.features,
+        dec_in=args.features,
+        model_dim=args.model_dim,
+        output_dim=1,
+        num_tickers=args.num_tickers,
+        dropout=0.1,
+        max_seq_len=max(args.lookback, args.horizon),
+        heads=args.heads,
+        checkpoint_layers=args.checkpoint_layers,
+    )
+    if args.memory_budget is not None:
+        from .memory import autotune_batch_size
+        args.batch_size = autotune_batch_size(model, args.lookback, args.horizon, int(args.memory_budget * 2**30))
+    print(f"batch_size={args.batch_size}")
@@ -0,0 +1,120 @@
+import copy
+import io
+import time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from pathlib import Path
+from typing import Dict, Tuple
+
+import torch
+import pandas as pd
+
+from .helper_modules import FFN, LinearFFN
+from .model import StockSolver
+from ..dataset.dataset import MultiTickerDataset
+from ..dataset.apis.alpha_vantage_calls import load_data
+
+parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+parser.add_argument("--dataset_path", type=Path, default=Path(".alpha_vantage_cache", "dataset"),
+                    help="Folder with the exported parquet files and manifest.")
+parser.add_argument("--checkpoint", type=Path, default=None,
+                    help="State dict of a trained StockSolver. Randomly initialised weights are used if omitted.")
+parser.add_argument("--holdout_days", type=int, default=250,
+                    help="Number of most recent trading days per ticker used as the held-out split.")
+parser.add_argument("--lookback", type=int, default=96)
+parser.add_argument("--horizon", type=int, default=3)
+parser.add_argument("--model_dim", type=int, default=128)
+parser.add_argument("--hidden_dim", type=int, default=512)
+parser.add_argument("--heads", type=int, default=8)
+parser.add_argument("--batch_size", type=int, default=64)
+parser.add_argument("--max_batches", type=int, default=50,
+                    help="Upper bound on the number of held-out batches to evaluate.")
+parser.add_argument("--engine", type=str, default=None,
+                    help="Quantized backend, e.g. x86, fbgemm or qnnpack. Keeps torch default if omitted.")
+parser.add_argument("--threads", type=int, default=None, help="Number of intra-op CPU threads.")
+
+
+def linearize_ffns(model: torch.nn.Module) -> torch.nn.Module:
+    """Replaces every Conv1d based `FFN` with an equivalent `LinearFFN` in place."""
+    for name, child in model.named_children():
+        if isinstance(child, FFN):
+            setattr(model, name, LinearFFN.from_conv(child))
+        else:
+            linearize_ffns(child)
+    return model
+
+
+def quantize_dynamic(model: torch.nn.Module, dtype: torch.dtype = torch.qint8) -> torch.nn.Module:
+    """Post-training dynamic quantization of every `Linear` layer, the original model is left untouched."""
+    model = linearize_ffns(copy.deepcopy(model)).eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=dtype)
+
+
+def model_size(model: torch.nn.Module) -> int:
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def holdout_split(data: Dict[str, pd.DataFrame], holdout_days: int, lookback: int) -> Dict[str, pd.DataFrame]:
+    # the lookback before the first held-out day is kept so every held-out day can be forecasted
+    return {ticker: df.iloc[-(holdout_days + lookback):] for ticker, df in data.items()}
+
+
+@torch.no_grad()
+def evaluate(
+    model: torch.nn.Module,
+    loader: torch.utils.data.DataLoader[Tuple[torch.Tensor, ...]],
+    max_batches: int,
+) -> Tuple[torch.Tensor, torch.Tensor, float]:
+    model.eval()
+    predictions, targets = [], []
+    elapsed = 0.0
+    for i, ((x, enc_marks), (y, dec_marks), ticker_ids) in enumerate(loader):
+        if i >= max_batches:
+            break
+        t0 = time.perf_counter()
+        out = model(x, enc_marks, dec_marks, ticker_ids)
+        elapsed += time.perf_counter() - t0
+        predictions.append(out[..., 0])
+        targets.append(y)
+    batches = max(1, len(predictions))
+    return torch.cat(predictions), torch.cat(targets), elapsed / batches
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.engine is not None:
+        torch.backends.quantized.engine = args.engine
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    data = holdout_split(load_data(args.dataset_path), args.holdout_days, args.lookback)
+    dataset = MultiTickerDataset(data, lookback=args.lookback, horizon=args.horizon)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=args.batch_size, shuffle=False)
+
+    model = StockSolver(
+        enc_in=len(dataset.feature_cols),
+        dec_in=len(dataset.feature_cols),
+        model_dim=args.model_dim,
+        output_dim=1,
+        num_tickers=len(dataset.tickers),
+        dropout=0.0,
+        max_seq_len=max(args.lookback, args.horizon),
+        heads=args.heads,
+        hidden_dim=args.hidden_dim,
+    )
+    if args.checkpoint is not None:
+        model.load_state_dict(torch.load(args.checkpoint, map_location="cpu"))
+    model.eval()
+    quantized = quantize_dynamic(model)
+
+    fp_pred, target, fp_latency = evaluate(model, loader, args.max_batches)
+    q_pred, _, q_latency = evaluate(quantized, loader, args.max_batches)
+
+    fp_mae = (fp_pred - target).abs().mean().item()
+    q_mae = (q_pred - target).abs().mean().item()
+    print(f"windows evaluated:   {len(target)}")
+    print(f"model size [MB]:     fp32 {model_size(model) / 2**20:.2f} | int8 {model_size(quantized) / 2**20:.2f}")
+    print(f"batch latency [ms]:  fp32 {fp_latency * 1e3:.2f} | int8 {q_latency * 1e3:.2f}")
+    print(f"forecast MAE:        fp32 {fp_mae:.6f} | int8 {q_mae:.6f} | delta {q_mae - fp_mae:+.6f}")
+    print(f"max |fp32 - int8|:   {(fp_pred - q_pred).abs().max().item():.6f}")
@@ -0,0 +1,241 @@
+"""
+Online scoring without rebuilding a `MultiTickerDataset`: the last `lookback` feature rows and calendar marks
+of every ticker live in one preallocated ring buffer, new bars are written in place and every `step` scores
+all tickers that received a bar since the previous step in one micro-batch.
+"""
+import time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+
+from ..dataset.apis.alpha_vantage_calls import load_data
+from ..dataset.dataset import MultiTickerDataset
+from ..metrics import configure as configure_metrics, registry
+from .model import StockSolver
+
+parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+parser.add_argument("--dataset_path", type=Path, default=Path(".alpha_vantage_cache", "dataset"),
+                    help="Folder with the parquet files, the last --replay_days are fed bar by bar.")
+parser.add_argument("--checkpoint", type=Path, default=None, help="StockSolver state dict, random weights if omitted.")
+parser.add_argument("--replay_days", type=int, default=20)
+parser.add_argument("--lookback", type=int, default=96)
+parser.add_argument("--horizon", type=int, default=3)
+parser.add_argument("--model_dim", type=int, default=128)
+parser.add_argument("--heads", type=int, default=8)
+parser.add_argument("--max_batch_size", type=int, default=512)
+parser.add_argument("--threads", type=int, default=None, help="Number of intra-op CPU threads.")
+parser.add_argument("--metrics_path", type=Path, default=None,
+                    help="Writes ingest and inference latencies to this file on exit, .prom or JSONL.")
+
+
+def date_marks(dates: np.ndarray) -> np.ndarray:
+    """[month, day, weekday] marks of `dates`, as `MultiTickerDataset._date_mark_array` builds them."""
+    return MultiTickerDataset._date_mark_array(pd.DatetimeIndex(dates))
+
+
+def trading_holidays(calendar: np.ndarray) -> np.ndarray:
+    """Weekdays between the first and last date of the trading `calendar` on which nothing traded."""
+    days = np.unique(calendar.astype("datetime64[D]"))
+    if len(days) == 0:
+        return days
+    weekdays = np.arange(days[0], days[-1] + 1, dtype="datetime64[D]")
+    weekdays = weekdays[np.is_busday(weekdays)]
+    return weekdays[~np.isin(weekdays, days)]
+
+
+class TickerRingBuffer:
+    """
+    Last `lookback` rows of every ticker in `[num_tickers, lookback, ...]` arrays. `head` is the slot the next
+    bar of a ticker goes to, reading a window rotates the slots back into time order with one gather.
+    """
+
+    def __init__(self, num_tickers: int, lookback: int, num_features: int):
+        self.L = lookback
+        self.features = np.zeros((num_tickers, lookback, num_features), dtype=np.float32)
+        self.marks = np.zeros((num_tickers, lookback, 3), dtype=np.int64)
+        self.head = np.zeros(num_tickers, dtype=np.int64)
+        self.count = np.zeros(num_tickers, dtype=np.int64)
+        self.last_date = np.full(num_tickers, np.datetime64("NaT"), dtype="datetime64[D]")
+        # tickers that received a bar since they were last scored
+        self.dirty = np.zeros(num_tickers, dtype=bool)
+        self._steps = np.arange(lookback)
+
+    def ingest(self, ticker_ids: np.ndarray, dates: np.ndarray, features: np.ndarray):
+        """Writes one bar per ticker (`ticker_ids` must be unique), O(1) per bar."""
+        head = self.head[ticker_ids]
+        self.features[ticker_ids, head] = features
+        self.marks[ticker_ids, head] = date_marks(dates)
+        self.head[ticker_ids] = (head + 1) % self.L
+        self.count[ticker_ids] += 1
+        self.last_date[ticker_ids] = dates.astype("datetime64[D]")
+        self.dirty[ticker_ids] = True
+
+    def ready(self) -> np.ndarray:
+        return self.count >= self.L
+
+    def windows(self, ticker_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Features and marks of the last `lookback` bars, oldest first: [B, L, F] and [B, L, 3]."""
+        slots = (self.head[ticker_ids, None] + self._steps) % self.L
+        rows = ticker_ids[:, None]
+        return self.features[rows, slots], self.marks[rows, slots]
+
+
+class StreamingPredictor:
+    """
+    `holidays` are the exchange holidays skipped by the decoder marks, as the training windows only contain
+    trading days. Holidays after the data the predictor was built from have to come from the exchange schedule.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        tickers: Sequence[str],
+        lookback: int,
+        horizon: int,
+        num_features: int,
+        max_batch_size: int = 512,
+        holidays: Optional[np.ndarray] = None,
+    ):
+        self.model = model.eval()
+        self.tickers = list(tickers)
+        self.ticker_ids = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.H = horizon
+        self.max_batch_size = max_batch_size
+        self.buffer = TickerRingBuffer(len(self.tickers), lookback, num_features)
+        self.calendar = np.busdaycalendar(holidays=np.empty(0, "datetime64[D]") if holidays is None else holidays)
+        self._horizon_steps = np.arange(1, horizon + 1)
+
+    @classmethod
+    def from_dataset(
+        cls,
+        model: torch.nn.Module,
+        dataset: MultiTickerDataset,
+        max_batch_size: int = 512,
+        holidays: Optional[np.ndarray] = None,
+    ) -> "StreamingPredictor":
+        """
+        Warm start from the last `lookback` rows of every ticker of `dataset`. The holidays within the
+        dataset's trading calendar are derived from it, `holidays` adds the ones after it.
+        """
+        calendar = np.concatenate([d.values for d in dataset.dates]) if dataset.dates else np.empty(0, "datetime64[ns]")
+        known = trading_holidays(calendar)
+        if holidays is not None:
+            known = np.union1d(known, np.asarray(holidays, dtype="datetime64[D]"))
+        predictor = cls(model, dataset.tickers, dataset.L, dataset.H, dataset.flat_X.shape[1], max_batch_size, known)
+        buffer = predictor.buffer
+        lengths = np.diff(dataset.offsets)
+        filled = np.minimum(lengths, dataset.L)
+        # the last `filled` rows of a ticker go to slots 0..filled-1, the next bar to slot `filled % L`
+        rows = dataset.offsets[1:, None] - filled[:, None] + buffer._steps
+        present = buffer._steps < filled[:, None]
+        ticker_ids, slots = np.nonzero(present)
+        buffer.features[ticker_ids, slots] = dataset.flat_X[rows[present]]
+        buffer.marks[ticker_ids, slots] = dataset.flat_marks[rows[present]]
+        buffer.head[:] = filled % dataset.L
+        buffer.count[:] = lengths
+        has_rows = lengths > 0
+        buffer.last_date[has_rows] = [dates[-1].to_datetime64() for dates, n in zip(dataset.dates, lengths) if n > 0]
+        return predictor
+
+    def ingest(self, tickers: Sequence[str], dates: np.ndarray, features: np.ndarray):
+        """One new bar ([len(tickers), num_features]) for each of `tickers`, e.g. from `FeatureEngine.update`."""
+        with registry.timer("stream_ingest_seconds"):
+            ticker_ids = np.fromiter((self.ticker_ids[t] for t in tickers), dtype=np.int64, count=len(tickers))
+            self.buffer.ingest(ticker_ids, np.asarray(dates, dtype="datetime64[ns]"), features)
+
+    def decoder_marks(self, ticker_ids: np.ndarray) -> np.ndarray:
+        """Marks of the next `horizon` trading days after the last bar of every ticker, [B, H, 3]."""
+        future = np.busday_offset(
+            self.buffer.last_date[ticker_ids, None], self._horizon_steps, roll="forward", busdaycal=self.calendar
+        )
+        return date_marks(future.ravel()).reshape(len(ticker_ids), self.H, 3)
+
+    @torch.inference_mode()
+    def step(self) -> Tuple[List[str], np.ndarray]:
+        """Scores every ticker with a new bar and a full window, returns them with their [B, horizon] forecasts."""
+        buffer = self.buffer
+        ticker_ids = np.flatnonzero(buffer.dirty & buffer.ready())
+        buffer.dirty[ticker_ids] = False
+        predictions: List[np.ndarray] = []
+        t0 = time.perf_counter()
+        for lo in range(0, len(ticker_ids), self.max_batch_size):
+            batch = ticker_ids[lo:lo + self.max_batch_size]
+            with registry.timer("stream_batch_seconds"):
+                x, enc_marks = buffer.windows(batch)
+                out = self.model(
+                    torch.from_numpy(x),
+                    torch.from_numpy(enc_marks),
+                    torch.from_numpy(self.decoder_marks(batch)),
+                    torch.from_numpy(batch),
+                )
+            predictions.append(out[..., 0].numpy())
+            registry.observe("stream_batch_size", len(batch))
+        if len(ticker_ids):
+            registry.observe("stream_step_seconds", time.perf_counter() - t0)
+        forecasts = np.concatenate(predictions) if predictions else np.empty((0, self.H), dtype=np.float32)
+        return [self.tickers[i] for i in ticker_ids], forecasts
+
+    @staticmethod
+    def latency() -> Dict[str, Dict[float, float]]:
+        """p50/p90/p99 of the recorded latencies, empty while the registry is disabled."""
+        latencies: Dict[str, Dict[float, float]] = {}
+        for name in ("stream_ingest_seconds", "stream_batch_seconds", "stream_step_seconds"):
+            summary = registry.summary(name)
+            if summary is not None:
+                latencies[name] = summary.quantiles()
+        return latencies
+
+
+def trading_calendar(data: Dict[str, pd.DataFrame]) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(np.unique(np.concatenate([df.index.values for df in data.values()])))
+
+
+def split_replay(data: Dict[str, pd.DataFrame], replay_days: int) -> Tuple[Dict[str, pd.DataFrame], pd.DatetimeIndex]:
+    """History before the last `replay_days` trading days, and those days."""
+    replay = trading_calendar(data)[-replay_days:]
+    history = {ticker: df[df.index < replay[0]] for ticker, df in data.items()}
+    return history, replay
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    configure_metrics(args.metrics_path)
+    # latencies are reported even without a metrics file
+    registry.enabled = True
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    data = load_data(args.dataset_path)
+    history, replay = split_replay(data, args.replay_days)
+    dataset = MultiTickerDataset(history, lookback=args.lookback, horizon=args.horizon, is_test=True)
+    num_features = len(dataset.feature_cols)
+    model = StockSolver(
+        enc_in=num_features,
+        dec_in=num_features,
+        model_dim=args.model_dim,
+        output_dim=1,
+        num_tickers=len(dataset.tickers),
+        dropout=0.0,
+        max_seq_len=max(args.lookback, args.horizon),
+        heads=args.heads,
+    )
+    if args.checkpoint is not None:
+        model.load_state_dict(torch.load(args.checkpoint, map_location="cpu"))
+    # the replayed days stand in for the exchange schedule of the days after the history
+    holidays = trading_holidays(trading_calendar(data).values)
+    predictor = StreamingPredictor.from_dataset(model, dataset, args.max_batch_size, holidays)
+
+    # the local feed: every replayed day delivers the bars of the tickers that traded on it
+    for day in replay:
+        bars = {ticker: df.loc[day, dataset.feature_cols] for ticker, df in data.items() if day in df.index}
+        features = np.stack([row.to_numpy(dtype=np.float32) for row in bars.values()])
+        predictor.ingest(list(bars), np.full(len(bars), day.to_datetime64()), features)
+        tickers, forecasts = predictor.step()
+        print(f"{day.date()}: scored {len(tickers)} tickers")
+
+    for name, quantiles in predictor.latency().items():
+        print(f"{name:24} p50 {quantiles[0.5] * 1e3:8.3f} ms | p99 {quantiles[0.99] * 1e3:8.3f} ms")
@@ -0,0 +1,67 @@
+import warnings
+
+import pytest
+import torch
+
+from src.stock_solver.benchmarks.suite import synthetic_data
+from src.stock_solver.dataset.dataset import MultiTickerDataset
+from src.stock_solver.evaluation.backtest import run_backtest, trading_calendar, walk_forward_folds
+from src.stock_solver.metrics import instrument_module, registry
+
+
+class ZeroForecast(torch.nn.Module):
+    def forward(self, x, enc_marks, dec_marks, ticker_ids):
+        return torch.zeros(x.size(0), dec_marks.size(1), 1)
+
+
+def fit(train: MultiTickerDataset, val: MultiTickerDataset) -> torch.nn.Module:
+    registry.inc("fits_total")
+    registry.observe("train_windows", len(train))
+    return ZeroForecast()
+
+
+@pytest.fixture
+def enabled_registry():
+    registry.reset()
+    registry.enabled = True
+    yield registry
+    registry.enabled = False
+    registry.reset()
+
+
+def test_worker_metrics_are_merged_into_the_parent(enabled_registry):
+    dataset = MultiTickerDataset(synthetic_data(num_tickers=4, num_days=120), lookback=8, horizon=2)
+    folds = walk_forward_folds(trading_calendar(dataset), train_days=40, val_days=10, test_days=20)
+    registry.inc("recorded_before_fork")
+
+    results = run_backtest(dataset, folds, fit, batch_size=32, workers=2)
+
+    assert len(results) == len(folds) > 1
+    assert registry.counters[("fits_total", ())] == len(folds)
+    assert registry.summary("train_windows").count == len(folds)
+    # the parent's own metrics are not counted again by every worker
+    assert registry.counters[("recorded_before_fork", ())] == 1
+
+
+def test_overlapping_test_ranges_are_rejected():
+    dataset = MultiTickerDataset(synthetic_data(num_tickers=4, num_days=120), lookback=8, horizon=2)
+    folds = walk_forward_folds(trading_calendar(dataset), train_days=40, val_days=10, test_days=20, step_days=10)
+    with pytest.raises(ValueError, match="overlap"):
+        run_backtest(dataset, folds, fit)
+
+
+def test_instrumented_backward_does_not_warn(enabled_registry):
+    # an embedding's input never requires grad, torch then warns about its full backward hook
+    model = torch.nn.Sequential(torch.nn.Embedding(4, 2), torch.nn.Linear(2, 2))
+    handles = instrument_module(model, (torch.nn.Embedding, torch.nn.Linear))
+    with warnings.catch_warnings(record=True) as caught:
+        model(torch.tensor([0, 3])).sum().backward()
+    for handle in handles:
+        handle.remove()
+    assert [str(w.message) for w in caught] == []
+    assert registry.summary("module_backward_seconds", module="0").count == 1
+
+
+def test_disabled_timer_allocates_nothing():
+    assert not registry.enabled
+    assert registry.timer("dataset_getitem_seconds") is registry.timer("stream_batch_seconds")
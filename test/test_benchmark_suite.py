@@ -0,0 +1,44 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+import torch
+
+from src.stock_solver.benchmarks.suite import CASES, compare, load, measure, run
+
+# a baseline stored with `python -m src.stock_solver.benchmarks.suite run --output baseline.json`,
+# the regression check only runs when it is given, timings are only comparable on the same machine
+BASELINE = os.environ.get("BENCHMARK_BASELINE")
+THRESHOLD = float(os.environ.get("BENCHMARK_THRESHOLD", "0.15"))
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_case_runs(name: str):
+    result = measure(CASES[name], repeats=1)
+    assert result["median"] > 0
+
+
+def test_compare_reports_slower_cases(tmp_path: Path):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps(run(["parsing/daily_ohlcv", "model/data_embedding"], repeats=1)), encoding="utf-8")
+    baseline = load(path)
+    assert compare(baseline, baseline, THRESHOLD) == []
+
+    current = json.loads(json.dumps(baseline))
+    current["results"]["model/data_embedding"]["median"] *= 1 + 2 * THRESHOLD
+    current["results"]["parsing/daily_ohlcv"]["median"] *= 1 - 2 * THRESHOLD
+    current["results"]["dataset/getitem"] = {"median": 1.0}
+    assert compare(baseline, current, THRESHOLD) == ["model/data_embedding"]
+
+
+@pytest.mark.skipif(BASELINE is None, reason="BENCHMARK_BASELINE is not set")
+def test_no_regression_against_baseline():
+    baseline = load(Path(BASELINE))
+    threads = torch.get_num_threads()
+    torch.set_num_threads(baseline["meta"].get("threads", 1))
+    try:
+        current = run([name for name in baseline["results"] if name in CASES], repeats=7)
+    finally:
+        torch.set_num_threads(threads)
+    assert compare(baseline, current, THRESHOLD) == []
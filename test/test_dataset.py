@@ -0,0 +1,69 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from src.stock_solver.benchmarks.suite import synthetic_data
+from src.stock_solver.dataset.dataset import DateAlignedDataset, MultiTickerDataset
+
+LOOKBACK, HORIZON = 8, 3
+
+
+def gapped_data() -> Dict[str, pd.DataFrame]:
+    """A late listing, a ticker that stops early and scattered missing days."""
+    data = synthetic_data(4, 80)
+    rng = np.random.default_rng(1)
+    data = {ticker: df[rng.random(len(df)) > 0.15] for ticker, df in data.items()}
+    data["T0001"] = data["T0001"].loc["2018-02-05":]
+    data["T0002"] = data["T0002"].loc[:"2018-03-15"]
+    return data
+
+
+def by_window(dataset: MultiTickerDataset) -> Dict[Tuple[int, pd.Timestamp], Tuple]:
+    """Items of `dataset` keyed by ticker and the date they are forecasted from."""
+    items = {}
+    for i, window in enumerate(dataset.win):
+        date = dataset.dates[window.ticker_id][window.start + dataset.L - 1]
+        items[window.ticker_id, date] = dataset[i]
+    return items
+
+
+def aligned_by_window(aligned: DateAlignedDataset) -> Dict[Tuple[int, pd.Timestamp], List[torch.Tensor]]:
+    items = {}
+    for i in range(len(aligned)):
+        (x, enc_marks), (y, dec_marks), ticker_ids = aligned[i]
+        for b, ticker_id in enumerate(ticker_ids.tolist()):
+            items[ticker_id, aligned.date(i)] = [x[b], enc_marks[b], y[b], dec_marks[b]]
+    return items
+
+
+def assert_same_windows(dataset: MultiTickerDataset, aligned: DateAlignedDataset):
+    expected, actual = by_window(dataset), aligned_by_window(aligned)
+    assert actual.keys() == expected.keys()
+    for key, ((x, enc_marks), (y, dec_marks), _) in expected.items():
+        for got, want in zip(actual[key], [x, enc_marks, y, dec_marks]):
+            assert torch.equal(got, want), key
+
+
+def test_aligned_items_are_the_dataset_windows():
+    dataset = MultiTickerDataset(gapped_data(), lookback=LOOKBACK, horizon=HORIZON)
+    aligned = DateAlignedDataset(dataset)
+    assert sum(len(aligned[i][2]) for i in range(len(aligned))) == len(dataset)
+    assert_same_windows(dataset, aligned)
+
+
+@pytest.mark.parametrize("start, end", [(None, "2018-03-01"), ("2018-03-01", None), ("2018-02-12", "2018-03-12")])
+def test_aligned_subsets_keep_only_their_windows(start, end):
+    dataset = MultiTickerDataset(gapped_data(), lookback=LOOKBACK, horizon=HORIZON)
+    subset = dataset.split_by_date(start and pd.Timestamp(start), end and pd.Timestamp(end))
+    assert 0 < len(subset) < len(dataset)
+    assert_same_windows(subset, DateAlignedDataset(subset))
+
+
+def test_min_tickers_drops_thin_dates():
+    dataset = MultiTickerDataset(gapped_data(), lookback=LOOKBACK, horizon=HORIZON)
+    aligned, full = DateAlignedDataset(dataset), DateAlignedDataset(dataset, min_tickers=4)
+    assert 0 < len(full) < len(aligned)
+    assert all(len(full[i][2]) == 4 for i in range(len(full)))
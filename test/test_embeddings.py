@@ -0,0 +1,87 @@
+import torch
+
+from src.stock_solver.benchmarks.embeddings import synthetic_inputs
+from src.stock_solver.model.embeddings import DataEmbedding, ValueEmbedding
+
+FEATURES, MODEL_DIM, NUM_TICKERS, LOOKBACK = 5, 32, 50, 64
+
+
+def make_embedding(dropout: float = 0.1) -> DataEmbedding:
+    torch.manual_seed(0)
+    return DataEmbedding(FEATURES, MODEL_DIM, NUM_TICKERS, dropout, LOOKBACK)
+
+
+def inputs():
+    torch.manual_seed(1)
+    return synthetic_inputs(8, LOOKBACK, FEATURES, NUM_TICKERS)
+
+
+def unfused_forward(embedding: DataEmbedding, x: torch.Tensor, ticker_ids: torch.Tensor, marks: torch.Tensor) -> torch.Tensor:
+    """Separate tensors, three temporal lookups and a materialized ticker embedding, summed in the fused order."""
+    temporal = embedding.temporal_embedding
+    value = embedding.value_embedding(x)
+    ticker = embedding.ticker_embedding.embedding(ticker_ids).unsqueeze(1).expand(-1, x.size(1), -1).contiguous()
+    marks_embedding = temporal.emb_month(marks[..., 0]) + temporal.emb_day(marks[..., 1]) + temporal.emb_weekday(marks[..., 2])
+    return value + embedding.positional_embedding(x) + ticker + marks_embedding
+
+
+def test_fused_eval_is_exactly_the_unfused_computation():
+    embedding = make_embedding().eval()
+    x, ticker_ids, marks = inputs()
+    with torch.no_grad():
+        fused = embedding(x, ticker_ids, marks)
+        reference = unfused_forward(embedding, x, ticker_ids, marks)
+    assert torch.equal(fused, reference)
+
+
+def test_eval_with_gradients_matches_inference():
+    embedding = make_embedding().eval()
+    x, ticker_ids, marks = inputs()
+    with torch.no_grad():
+        fused = embedding(x, ticker_ids, marks)
+    assert torch.equal(embedding(x, ticker_ids, marks).detach(), fused)
+
+
+def test_train_mode_without_dropout_matches_eval():
+    embedding = make_embedding(dropout=0.0)
+    x, ticker_ids, marks = inputs()
+    train = embedding.train()(x, ticker_ids, marks).detach()
+    with torch.no_grad():
+        evaluated = embedding.eval()(x, ticker_ids, marks)
+    assert torch.equal(train, evaluated)
+
+
+def test_value_embedding_matches_circular_conv():
+    value = ValueEmbedding(FEATURES, MODEL_DIM)
+    x, _, _ = inputs()
+    with torch.no_grad():
+        conv = value.layer(x.transpose(1, 2)).transpose(1, 2)
+        # unfold + linear sums the kernel taps in a different order than the conv, equal up to float32 rounding
+        torch.testing.assert_close(value(x), conv, rtol=1e-5, atol=1e-5)
+
+
+def test_gradients_reach_every_weight_in_eval_mode():
+    embedding = make_embedding().eval()
+    x, ticker_ids, marks = inputs()
+    embedding(x, ticker_ids, marks).sum().backward()
+    for name, parameter in embedding.named_parameters():
+        assert parameter.grad is not None and parameter.grad.abs().sum() > 0, name
+
+
+def test_fused_table_follows_weight_updates():
+    embedding = make_embedding().eval()
+    x, ticker_ids, marks = inputs()
+    with torch.no_grad():
+        before = embedding(x, ticker_ids, marks)
+
+    # fine-tuning in eval mode, e.g. with frozen normalization statistics
+    optimizer = torch.optim.SGD(embedding.parameters(), lr=1.0)
+    embedding(x, ticker_ids, marks).sum().backward()
+    optimizer.step()
+    with torch.no_grad():
+        after = embedding(x, ticker_ids, marks)
+        assert not torch.equal(before, after)
+        assert torch.equal(after, unfused_forward(embedding, x, ticker_ids, marks))
+
+        embedding.load_state_dict(make_embedding().state_dict())
+        assert torch.equal(embedding(x, ticker_ids, marks), before)
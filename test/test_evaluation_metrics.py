@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from src.stock_solver.evaluation.backtest import Fold, FoldResult, score
+from src.stock_solver.evaluation.metrics import evaluate_predictions
+
+NUM_DATES, NUM_TICKERS, HORIZON = 9, 10, 3
+
+
+def windows(realized_returns: np.ndarray):
+    """One window per (date, ticker), a perfect forecast of `realized_returns` [dates, tickers]."""
+    date_ids, ticker_ids = np.divmod(np.arange(NUM_DATES * NUM_TICKERS), NUM_TICKERS)
+    last_close = np.full(len(date_ids), 100.0)
+    targets = np.repeat((last_close * (1 + realized_returns.ravel()))[:, None], HORIZON, axis=1)
+    return targets.copy(), targets, last_close, date_ids, ticker_ids
+
+
+def test_long_short_book_only_holds_non_overlapping_horizons():
+    # the top two tickers return 1% more than the bottom two over every horizon
+    realized = np.tile(np.linspace(-0.02, 0.02, NUM_TICKERS), (NUM_DATES, 1))
+    realized += np.arange(NUM_DATES)[:, None] * 1e-3
+    metrics = evaluate_predictions(*windows(realized), NUM_DATES, NUM_TICKERS, quantile=0.2)
+
+    spread = realized[0, -2:].mean() - realized[0, :2].mean()
+    # rebalanced on dates 0, 3 and 6, not on all 9 dates with overlapping returns
+    assert np.isclose(metrics["long_short_pnl"], spread * NUM_DATES / HORIZON)
+    assert metrics["ic"] == 1.0 and metrics["directional_accuracy"] > 0.5
+
+
+def test_rebalancing_follows_the_trading_calendar():
+    # the spread between the top and bottom tickers grows every day, so the rebalance dates show in the pnl
+    spread = np.linspace(-0.01, 0.01, NUM_TICKERS)
+    realized = spread * (1 + np.arange(NUM_DATES))[:, None]
+    predictions, targets, last_close, date_ids, ticker_ids = windows(realized)
+    calendar = pd.bdate_range("2024-01-01", periods=NUM_DATES)
+    # nothing was forecasted on the second trading day, rebalancing still happens on days 0, 3 and 6
+    kept = date_ids != 1
+    fold = Fold(0, *[(calendar[0], calendar[-1])] * 3)
+    result = FoldResult(
+        fold, predictions[kept], targets[kept], last_close[kept], calendar.values[date_ids[kept]], ticker_ids[kept]
+    )
+    metrics = score([result], calendar, NUM_TICKERS)
+
+    book = realized[:, -2:].mean(axis=1) - realized[:, :2].mean(axis=1)
+    assert np.isclose(metrics["long_short_pnl"], book[[0, 3, 6]].sum())
@@ -0,0 +1,118 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.stock_solver.dataset.features import FeatureEngine, FeatureSpec
+from src.stock_solver.dataset.resampling import flatten
+
+SPEC = FeatureSpec()
+
+
+def bars(lengths=(120, 80, 100), seed: int = 0) -> Dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    data: Dict[str, pd.DataFrame] = {}
+    for i, length in enumerate(lengths):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+        data[f"T{i}"] = pd.DataFrame({
+            "open": close * rng.uniform(0.98, 1.02, length),
+            "high": close * rng.uniform(1.0, 1.03, length),
+            "low": close * rng.uniform(0.97, 1.0, length),
+            "close": close,
+            "adjusted_close": close * 0.9,
+            "volume": rng.integers(1, 1_000_000, length).astype(np.float64),
+        }, index=pd.bdate_range("2020-01-01", periods=length, name="date"))
+    return data
+
+
+def with_missing_close(data: Dict[str, pd.DataFrame], ticker: str = "T0", row: int = 30) -> Dict[str, pd.DataFrame]:
+    # `fetch_daily_OHLCV` coerces unparsable values to NaN
+    data[ticker].iloc[row, data[ticker].columns.get_loc("adjusted_close")] = np.nan
+    return data
+
+
+def pandas_features(df: pd.DataFrame, spec: FeatureSpec = SPEC) -> pd.DataFrame:
+    """The features of one ticker with pandas rolling windows and exponential averages."""
+    adjusted = df["adjusted_close"]
+    returns = adjusted / adjusted.shift(1) - 1
+    returns.iloc[0] = 0.0
+    out = {"return": returns, "log_volume": np.log1p(df["volume"])}
+    for w in spec.volatility_windows:
+        out[f"volatility_{w}d"] = returns.rolling(w, min_periods=1).std(ddof=0)
+    for w in spec.sma_windows:
+        out[f"sma_ratio_{w}d"] = adjusted / adjusted.rolling(w, min_periods=1).mean() - 1
+    for w in spec.range_windows:
+        high = df["high"].rolling(w, min_periods=1).max()
+        low = df["low"].rolling(w, min_periods=1).min()
+        span = high - low
+        out[f"range_position_{w}d"] = ((df["close"] - low) / span).where(span > 0, 0.5)
+
+    def ewm(x: pd.Series, alpha: float) -> pd.Series:
+        return x.ewm(alpha=alpha, adjust=False, ignore_na=True).mean()
+
+    delta = adjusted.diff()
+    delta.iloc[0] = 0.0
+    if spec.rsi_period is not None:
+        gain = ewm(delta.clip(lower=0), 1 / spec.rsi_period)
+        loss = ewm((-delta).clip(lower=0), 1 / spec.rsi_period)
+        total = gain + loss
+        out[f"rsi_{spec.rsi_period}"] = (gain / total).where(total > 0, 0.5)
+    if spec.macd is not None:
+        fast, slow, signal_span = spec.macd
+        slow_average = ewm(adjusted, 2 / (slow + 1))
+        macd = (ewm(adjusted, 2 / (fast + 1)) - slow_average) / slow_average
+        signal = ewm(macd, 2 / (signal_span + 1))
+        out.update(macd=macd, macd_signal=signal, macd_hist=macd - signal)
+    return pd.DataFrame(out)[spec.columns()]
+
+
+def assert_features_equal(actual: np.ndarray, expected: np.ndarray):
+    np.testing.assert_allclose(actual, expected.astype(np.float32), rtol=1e-4, atol=1e-6)
+
+
+@pytest.mark.parametrize("missing", [False, True])
+def test_transform_matches_pandas_per_ticker(missing: bool):
+    data = with_missing_close(bars()) if missing else bars()
+    values, _, offsets = flatten(data)
+    features = FeatureEngine().transform(values, offsets)
+    for ticker_id, df in enumerate(data.values()):
+        block = features[offsets[ticker_id]:offsets[ticker_id + 1]]
+        assert_features_equal(block, pandas_features(df).to_numpy())
+
+
+def test_missing_close_stays_local():
+    data = with_missing_close(bars())
+    values, _, offsets = flatten(data)
+    features = FeatureEngine().transform(values, offsets)
+    missing = np.isnan(features)
+    assert not missing[offsets[1]:].any(), "NaN leaked into the next tickers"
+    # only the rows whose own close or previous close is missing, and the SMA ratios of the missing close
+    assert np.flatnonzero(missing.any(axis=1)).tolist() == [30, 31]
+
+
+@pytest.mark.parametrize("missing", [False, True])
+def test_updates_match_transform_of_the_extended_history(missing: bool, tmp_path):
+    data = with_missing_close(bars(), row=100) if missing else bars()
+    history = {ticker: df.iloc[:60] for ticker, df in data.items()}
+    engine = FeatureEngine()
+    values, _, offsets = flatten(history)
+    engine.transform(values, offsets)
+
+    full_values, _, full_offsets = flatten(data)
+    expected = FeatureEngine().transform(full_values, full_offsets)
+    lengths = np.diff(full_offsets)
+    for position in range(60, int(lengths.max())):
+        if position == 90:
+            # restart from the persisted state halfway
+            engine.save(tmp_path / "engine.npz")
+            engine = FeatureEngine.load(tmp_path / "engine.npz")
+        ticker_ids = np.flatnonzero(lengths > position)
+        rows = full_offsets[ticker_ids] + position
+        assert_features_equal(engine.update(ticker_ids, full_values[rows]), expected[rows])
+
+
+def test_state_of_a_different_spec_is_rejected():
+    engine = FeatureEngine(num_tickers=2)
+    with pytest.raises(ValueError):
+        FeatureEngine(FeatureSpec(sma_windows=(10,))).load_state_dict(engine.state_dict())
@@ -0,0 +1,25 @@
+from pathlib import Path
+
+import pytest
+
+from src.stock_solver.benchmarks.import_time import BUDGETS, budget_scale, median_import_time
+
+REPEATS = 3
+
+
+@pytest.fixture(scope="module")
+def cwd(tmp_path_factory) -> Path:
+    return tmp_path_factory.mktemp("import_time")
+
+
+@pytest.fixture(scope="module")
+def scale(cwd: Path) -> float:
+    return budget_scale(cwd, REPEATS)
+
+
+@pytest.mark.parametrize("module", list(BUDGETS))
+def test_import_stays_cheap(module: str, cwd: Path, scale: float):
+    median, heavy = median_import_time(module, cwd, REPEATS)
+    assert not heavy, f"{module} imports {heavy} eagerly"
+    assert median <= BUDGETS[module] * scale, f"{module} took {median:.1f} ms"
+    assert not list(cwd.iterdir()), f"importing {module} created files"
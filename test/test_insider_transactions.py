@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from src.stock_solver.dataset.apis.alpha_vantage_calls import aggregate_insider_transactions
+
+INDEX = pd.bdate_range("2024-01-01", periods=30, name="date")
+
+
+def trades(dates, values, acquired) -> pd.DataFrame:
+    return pd.DataFrame({"shares": np.ones(len(dates)), "value": values, "acquired": acquired},
+                        index=pd.DatetimeIndex(dates, name="date"))
+
+
+def test_trades_land_on_the_first_day_they_were_known():
+    out = aggregate_insider_transactions(trades(["2023-12-28", "2024-01-10"], [200.0, 300.0], [True, False]), INDEX)
+    # filed two business days after the trade
+    assert out["insider_acquired_value"].to_dict() == {**dict.fromkeys(INDEX, 0.0), pd.Timestamp("2024-01-01"): 200.0}
+    assert out.loc["2024-01-12", "insider_disposed_value"] == 300.0
+    assert out["insider_trades_63d"].iloc[-1] == 2
+
+
+def test_trades_known_before_the_index_are_dropped():
+    out = aggregate_insider_transactions(trades(["2023-06-01", "2023-12-01"], [100.0, 100.0], [True, True]), INDEX)
+    assert not out.to_numpy().any()
+
+
+def test_no_trades():
+    out = aggregate_insider_transactions(trades([], [], np.array([], dtype=bool)), INDEX)
+    assert out.shape[0] == len(INDEX) and not out.to_numpy().any()
+    assert aggregate_insider_transactions(trades(["2024-01-10"], [1.0], [True]), INDEX[:0]).empty
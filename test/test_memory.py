@@ -0,0 +1,64 @@
+import pytest
+import torch
+
+from src.stock_solver.model.memory import (
+    _synthetic_batch, activation_profile, autotune_batch_size, estimate_sample_bytes, parameter_bytes
+)
+from src.stock_solver.model.model import StockSolver
+
+LOOKBACK, HORIZON = 32, 3
+
+
+def make_model(checkpoint_layers: bool = False, dropout: float = 0.1) -> StockSolver:
+    torch.manual_seed(0)
+    return StockSolver(
+        enc_in=5, dec_in=5, model_dim=32, output_dim=1, num_tickers=4, dropout=dropout,
+        max_seq_len=LOOKBACK, heads=4, hidden_dim=64, checkpoint_layers=checkpoint_layers,
+    )
+
+
+def gradients(model: StockSolver):
+    torch.manual_seed(1)
+    batch = _synthetic_batch(model, 4, LOOKBACK, HORIZON)
+    torch.manual_seed(2)
+    model.train()(*batch).square().mean().backward()
+    return {name: parameter.grad for name, parameter in model.named_parameters()}
+
+
+def test_checkpointed_layers_give_the_same_gradients():
+    # dropout is replayed from the saved RNG state during recomputation
+    plain, checkpointed = gradients(make_model()), gradients(make_model(checkpoint_layers=True))
+    assert plain.keys() == checkpointed.keys()
+    for name, grad in plain.items():
+        torch.testing.assert_close(checkpointed[name], grad, rtol=1e-5, atol=1e-7, msg=name)
+
+
+def test_profiling_leaves_the_model_untouched():
+    model = make_model().eval()
+    state = {name: tensor.clone() for name, tensor in model.state_dict().items()}
+    activation_profile(model, LOOKBACK, HORIZON)
+    assert not model.training
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(tensor, state[name]), name
+
+
+def test_checkpointing_is_read_from_the_layers():
+    assert estimate_sample_bytes(make_model(checkpoint_layers=True), LOOKBACK, HORIZON) < \
+        estimate_sample_bytes(make_model(), LOOKBACK, HORIZON)
+
+
+@pytest.mark.parametrize("checkpoint_layers", [False, True])
+def test_autotuned_batch_fits_the_budget(checkpoint_layers: bool):
+    model = make_model(checkpoint_layers)
+    budget = parameter_bytes(model) + 64 * 2**20
+    batch_size = autotune_batch_size(model, LOOKBACK, HORIZON, budget, safety=1.0)
+    per_sample = estimate_sample_bytes(model, LOOKBACK, HORIZON)
+    assert parameter_bytes(model) + batch_size * per_sample <= budget
+    assert parameter_bytes(model) + (batch_size + 1) * per_sample > budget
+    if not checkpoint_layers:
+        # what autograd really keeps alive at that batch size
+        saved, _, _ = activation_profile(model, LOOKBACK, HORIZON, batch_size)
+        assert parameter_bytes(model) + saved <= budget
+
+    with pytest.raises(ValueError):
+        autotune_batch_size(model, LOOKBACK, HORIZON, parameter_bytes(model) + per_sample // 2)
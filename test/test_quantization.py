@@ -0,0 +1,83 @@
+import pytest
+import torch
+
+from src.stock_solver.model.attentions import AttentionLayer
+from src.stock_solver.model.helper_modules import FFN, LinearFFN
+from src.stock_solver.model.memory import _synthetic_batch
+from src.stock_solver.model.model import StockSolver
+from src.stock_solver.model.quantization import linearize_ffns, quantize_dynamic
+
+LOOKBACK, HORIZON = 32, 3
+
+
+def make_model() -> StockSolver:
+    torch.manual_seed(0)
+    return StockSolver(
+        enc_in=5, dec_in=5, model_dim=32, output_dim=1, num_tickers=4, dropout=0.1,
+        max_seq_len=LOOKBACK, heads=4, hidden_dim=64,
+    ).eval()
+
+
+def batch():
+    torch.manual_seed(1)
+    return _synthetic_batch(make_model(), 8, LOOKBACK, HORIZON)
+
+
+def test_linear_ffn_matches_the_conv_ffn():
+    torch.manual_seed(0)
+    ffn = FFN(32, 64, dropout=0.1).eval()
+    x = torch.randn(8, LOOKBACK, 32)
+    torch.testing.assert_close(LinearFFN.from_conv(ffn)(x), ffn(x))
+
+
+@torch.no_grad()
+def test_linearized_model_matches_the_conv_model():
+    model, inputs = make_model(), batch()
+    expected = model(*inputs)
+    linear = linearize_ffns(make_model())
+    assert not any(isinstance(module, FFN) for module in linear.modules())
+    torch.testing.assert_close(linear(*inputs), expected)
+
+
+@pytest.mark.skipif(not torch.backends.quantized.supported_engines, reason="no quantized engine")
+@torch.no_grad()
+def test_quantize_dynamic_replaces_every_ffn_linear():
+    model = make_model()
+    quantized = quantize_dynamic(model)
+    # the original model keeps its float conv FFNs
+    assert any(isinstance(module, FFN) for module in model.modules())
+
+    ffns = [module for name, module in quantized.named_modules() if name.endswith(".ffn")]
+    assert len(ffns) == len(model.encoder) + len(model.decoder)
+    for ffn in ffns:
+        layers = [layer for layer in ffn.layers if not isinstance(layer, (torch.nn.ReLU, torch.nn.Dropout))]
+        assert len(layers) == 2
+        assert all(isinstance(layer, torch.ao.nn.quantized.dynamic.Linear) for layer in layers)
+    assert not any(type(module) is torch.nn.Linear for module in quantized.modules())
+
+    inputs = batch()
+    torch.testing.assert_close(quantized(*inputs), model(*inputs), rtol=0.0, atol=0.1)
+
+
+@torch.no_grad()
+def test_padded_keys_do_not_change_the_attention():
+    torch.manual_seed(0)
+    attention = AttentionLayer(32, 4, factor=1, attn_dropout=0.0, proj_dropout=0.0)
+    x = torch.randn(2, 12, 32)
+    padding = torch.zeros(2, 12, dtype=torch.bool)
+    padding[0, 9:] = padding[1, 5:] = True
+    noisy = torch.where(padding[..., None], torch.randn_like(x), x)
+    out = attention(x, x, x, key_padding_mask=padding)
+    torch.testing.assert_close(attention(x, noisy, noisy, key_padding_mask=padding), out)
+
+
+@torch.no_grad()
+def test_causal_mask_hides_later_steps():
+    torch.manual_seed(0)
+    attention = AttentionLayer(32, 4, factor=1, attn_dropout=0.0, proj_dropout=0.0)
+    x = torch.randn(2, 12, 32)
+    causal = torch.ones(12, 12, dtype=torch.bool).triu(diagonal=1)
+    # the first step may only attend to itself, whether it is one of the selected queries or not
+    later = torch.cat([x[:, :1], torch.randn(2, 11, 32)], dim=1)
+    torch.testing.assert_close(attention(later, attn_mask=causal)[:, 0], attention(x, attn_mask=causal)[:, 0])
+    assert not torch.allclose(attention(later)[:, 0], attention(x)[:, 0])
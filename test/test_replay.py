@@ -0,0 +1,85 @@
+import os
+import threading
+from typing import Callable, Iterator, Optional
+
+import pytest
+
+from src.stock_solver.dataset.apis import alpha_vantage as AV
+from src.stock_solver.dataset.apis.alpha_vantage import cache as cache_module
+from src.stock_solver.dataset.apis.alpha_vantage.replay import Cassette, Faults, ReplayServer, SyntheticPayloads, serve
+from src.stock_solver.dataset.apis.alpha_vantage.requests.request import BASE_URL_ENV
+
+IBM = {"function": "OVERVIEW", "symbol": "IBM"}
+RECORDED = b'{"Symbol": "IBM", "AssetType": "Common Stock", "MarketCapitalization": "150000000000"}'
+
+
+@pytest.fixture(autouse=True)
+def uncached_wrapper(monkeypatch):
+    monkeypatch.setenv("ALPHA_VANTAGE_API_KEY", "test")
+    monkeypatch.setattr(cache_module, "response_cache", None)
+
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch) -> Iterator[Callable[..., ReplayServer]]:
+    """Starts a server with the IBM overview recorded on a free port and points the wrapper at it."""
+    cassette = Cassette(tmp_path / "cassettes")
+    cassette.save({**IBM, "apikey": "recorded with another key"}, RECORDED)
+    servers = []
+
+    def start(faults: Optional[Faults] = None, synthetic: Optional[SyntheticPayloads] = None) -> ReplayServer:
+        server = ReplayServer(("127.0.0.1", 0), cassette=cassette, synthetic=synthetic, faults=faults)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv(BASE_URL_ENV, server.url)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_recorded_responses_are_played_back(replay):
+    server = replay()
+    assert server.server_address[1] != 0
+    response = AV.OverviewRequest(symbol="IBM").query()
+    assert response.content == RECORDED
+    assert AV.OverviewResult.model_validate(response.json()).market_capitalization == 150_000_000_000
+    assert server.stats.calls["OVERVIEW"] == 1
+
+
+def test_missing_recordings_are_synthesized_or_not_found(replay):
+    server = replay()
+    with pytest.raises(ValueError):
+        AV.OverviewRequest(symbol="MSFT").query()
+    assert server.stats.misses == 1
+
+    server = replay(synthetic=SyntheticPayloads(days=10))
+    assert AV.OverviewRequest(symbol="MSFT").query().json()["Symbol"] == "MSFT"
+    assert server.stats.misses == 0
+
+
+def test_throttle_notes_surface_as_api_errors(replay):
+    server = replay(Faults(throttle_rate=1.0))
+    for _ in range(4):
+        response = AV.OverviewRequest(symbol="IBM").query()
+        assert response.status_code == 200
+        with pytest.raises(AV.APIError):
+            AV.OverviewResult.model_validate(response.json())
+    assert server.stats.throttled == 4
+
+
+def test_server_errors_surface_as_api_errors(replay):
+    server = replay(Faults(error_rate=1.0))
+    with pytest.raises(AV.APIError) as error:
+        AV.OverviewRequest(symbol="IBM").query()
+    assert error.value.data == 503
+    assert server.stats.errors == 1
+
+
+def test_serve_restores_the_base_url(monkeypatch):
+    monkeypatch.setenv(BASE_URL_ENV, "http://127.0.0.1:1/query")
+    with serve(synthetic=SyntheticPayloads(days=10)) as server:
+        assert AV.OverviewRequest(symbol="IBM").query().json()["Symbol"] == "IBM"
+        assert server.stats.calls["OVERVIEW"] == 1
+    assert os.environ[BASE_URL_ENV] == "http://127.0.0.1:1/query"
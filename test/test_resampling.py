@@ -0,0 +1,99 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.stock_solver.dataset.resampling import (
+    BAR_COLS, IncrementalResampler, completed_bar_index, flatten, resample, resampled_feature_cols,
+    with_resampled_features,
+)
+
+PANDAS_RULES = {"W": "W-SUN", "M": "MS"}
+AGGREGATIONS = {"open": "first", "high": "max", "low": "min", "close": "last", "adjusted_close": "last", "volume": "sum"}
+
+
+def daily(seed: int = 0) -> Dict[str, pd.DataFrame]:
+    """Tickers listed on different days, with holidays and a suspension."""
+    rng = np.random.default_rng(seed)
+    data: Dict[str, pd.DataFrame] = {}
+    for ticker, start, days in [("A", "2021-01-04", 300), ("B", "2021-02-17", 200), ("C", "2021-03-31", 150)]:
+        dates = pd.bdate_range(start, periods=days, name="date")
+        dates = dates[rng.random(days) > 0.1]  # missing days, some weeks end early or start late
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        data[ticker] = pd.DataFrame({
+            "open": close * rng.uniform(0.99, 1.01, len(dates)),
+            "high": close * 1.02,
+            "low": close * 0.98,
+            "close": close,
+            "adjusted_close": close * 0.5,
+            "volume": rng.integers(1, 10_000, len(dates)).astype(np.float64),
+        }, index=dates)
+    return data
+
+
+@pytest.mark.parametrize("freq", ["W", "M"])
+def test_resample_matches_pandas(freq: str):
+    data = daily()
+    bars = resample(*flatten(data), freq)
+    for ticker_id, df in enumerate(data.values()):
+        expected = df[list(BAR_COLS)].resample(PANDAS_RULES[freq]).agg(AGGREGATIONS).dropna()
+        np.testing.assert_allclose(bars.ticker(ticker_id), expected.to_numpy())
+
+
+@pytest.mark.parametrize("freq", ["W", "M"])
+def test_incremental_resampler_matches_batch(freq: str):
+    data = daily()
+    values, dates, offsets = flatten(data)
+    split = pd.Timestamp("2021-06-15")
+    history = {ticker: df[df.index < split] for ticker, df in data.items()}
+    resampler = IncrementalResampler.from_bars(resample(*flatten(history), freq))
+
+    completed = {ticker_id: [] for ticker_id in range(len(data))}
+    rest = {ticker_id: df[df.index >= split] for ticker_id, df in enumerate(data.values())}
+    for day in sorted(set().union(*(df.index for df in rest.values()))):
+        ticker_ids = np.array([i for i, df in rest.items() if day in df.index])
+        new = np.stack([rest[i].loc[day, list(BAR_COLS)].to_numpy(np.float64) for i in ticker_ids])
+        finished, done = resampler.update(ticker_ids, np.full(len(ticker_ids), day.to_datetime64()), new)
+        for ticker_id, bar in zip(finished, done):
+            completed[ticker_id].append(bar)
+
+    batch = resample(values, dates, offsets, freq)
+    history_bars = resample(*flatten(history), freq)
+    for ticker_id in range(len(data)):
+        expected = batch.ticker(ticker_id)
+        # the history's last bar was still open, the updates completed it and every later bar but the current one
+        already = len(history_bars.ticker(ticker_id)) - 1
+        np.testing.assert_allclose(np.array(completed[ticker_id]), expected[already:-1])
+        np.testing.assert_allclose(resampler.current[ticker_id], expected[-1])
+        np.testing.assert_allclose(resampler.completed[ticker_id], expected[-2])
+
+
+def test_completed_bar_index_at_week_boundaries():
+    # listed on a Wednesday, the Monday after is a holiday
+    dates = pd.DatetimeIndex(["2024-01-03", "2024-01-04", "2024-01-05", "2024-01-09", "2024-01-12", "2024-01-15"])
+    values = np.arange(len(dates) * len(BAR_COLS), dtype=np.float64).reshape(len(dates), len(BAR_COLS))
+    offsets = np.array([0, len(dates)])
+    bars = resample(values, dates.values, offsets, "W")
+    assert completed_bar_index(bars, offsets, len(dates)).tolist() == [-1, -1, -1, 0, 0, 1]
+
+    # a second ticker starts over after the first one's three bars, its first week has no completed bar either
+    both = np.concatenate([values, values])
+    offsets = np.array([0, len(dates), 2 * len(dates)])
+    bars = resample(both, np.concatenate([dates.values, dates.values]), offsets, "W")
+    assert completed_bar_index(bars, offsets, len(both)).tolist() == [-1, -1, -1, 0, 0, 1, -1, -1, -1, 3, 3, 4]
+
+
+def test_first_period_is_flagged_instead_of_filled_with_the_daily_bar():
+    data = {"A": daily()["A"]}
+    out = with_resampled_features(data)["A"]
+    assert list(out.columns[-len(resampled_feature_cols()):]) == resampled_feature_cols()
+
+    first_week = out.index < pd.Timestamp("2021-01-11")
+    assert (out.loc[first_week, "weekly_valid"] == 0).all() and (out.loc[~first_week, "weekly_valid"] == 1).all()
+    assert (out.loc[first_week, "weekly_volume"] == 0).all()
+    week = data["A"].loc["2021-01-04":"2021-01-10"]
+    following = out.loc["2021-01-11":"2021-01-17"]
+    assert (following["weekly_volume"] == week["volume"].sum()).all()
+    assert (following["weekly_close"] == np.float32(week["close"].iloc[-1])).all()
+    assert (out.loc[out.index < pd.Timestamp("2021-02-01"), "monthly_valid"] == 0).all()
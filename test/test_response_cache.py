@@ -0,0 +1,124 @@
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from src.stock_solver.dataset.apis import alpha_vantage as AV
+from src.stock_solver.dataset.apis.alpha_vantage import cache as cache_module
+from src.stock_solver.dataset.apis.alpha_vantage.cache import (
+    ENDPOINT_TTLS, MARKET_TIMEZONE, NEWS_SETTLE, ResponseCache, expires_at
+)
+from src.stock_solver.dataset.apis.alpha_vantage.requests.request import BASE_URL_ENV
+
+NEWS = {"function": "NEWS_SENTIMENT", "tickers": "IBM", "time_from": "20240109T1000", "time_to": "20240110T1000"}
+TIME_TO = datetime(2024, 1, 10, 10, tzinfo=ZoneInfo(MARKET_TIMEZONE))
+
+
+@pytest.fixture(params=["UTC", "Asia/Tokyo", "America/Los_Angeles"])
+def host_timezone(request, monkeypatch):
+    monkeypatch.setenv("TZ", request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_news_windows_settle_in_market_time(host_timezone):
+    settled = (TIME_TO + NEWS_SETTLE).timestamp()
+    assert expires_at(NEWS, settled + 60) is None
+    assert expires_at(NEWS, settled - 60) is not None
+
+
+class Clock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+def overview(symbol: str, apikey: str = "key") -> dict:
+    return {"function": "OVERVIEW", "symbol": symbol, "apikey": apikey}
+
+
+def body(size: int = 1000, seed: int = 0) -> bytes:
+    # incompressible, so the stored size is known
+    return np.random.default_rng(seed).bytes(size)
+
+
+def test_round_trip_without_the_api_key(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    cache.put(overview("IBM", apikey="first"), b'{"Symbol": "IBM"}')
+    assert cache.get(overview("IBM", apikey="second")) == b'{"Symbol": "IBM"}'
+    assert cache.get(overview("MSFT")) is None
+    assert cache.stats()["OVERVIEW"]["hits"] == 1 and cache.stats()["OVERVIEW"]["misses"] == 1
+
+
+def test_entries_expire_after_their_ttl(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    cache.put(overview("IBM"), b"{}1")
+    clock.now += ENDPOINT_TTLS["OVERVIEW"] - 1
+    assert cache.get(overview("IBM")) == b"{}1"
+    clock.now += 2
+    assert cache.get(overview("IBM")) is None
+
+
+def test_error_bodies_are_not_stored(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    cache.put(overview("IBM"), b'{"Note": "Thank you for using Alpha Vantage! Please slow down."}')
+    cache.put(overview("MSFT"), b'{"Error Message": "Invalid API call."}')
+    assert cache.get(overview("IBM")) is None and cache.get(overview("MSFT")) is None
+    assert cache.stats()["OVERVIEW"]["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "responses.sqlite", max_bytes=3500)
+    for i, symbol in enumerate(["A", "B", "C"]):
+        clock.now += 1
+        cache.put(overview(symbol), body(seed=i))
+    clock.now += 1
+    assert cache.get(overview("A")) is not None
+    clock.now += 1
+    cache.put(overview("D"), body(seed=3))
+    assert [cache.get(overview(symbol)) is not None for symbol in "ABCD"] == [True, False, True, True]
+
+
+def test_writers_sharing_the_file_stay_within_the_budget(tmp_path, clock):
+    path = tmp_path / "responses.sqlite"
+    writers = [ResponseCache(path, max_bytes=5500) for _ in range(2)]
+    for i in range(10):
+        clock.now += 1
+        writers[i % 2].put(overview(f"T{i}"), body(seed=i))
+    assert writers[0].stats()["OVERVIEW"]["bytes"] <= 5500
+    assert writers[1].stats()["OVERVIEW"]["entries"] == 5
+
+
+def test_clear_one_endpoint(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    cache.put(overview("IBM"), b"{}1")
+    cache.put({"function": "TIME_SERIES_DAILY", "symbol": "IBM"}, b"{}2")
+    assert cache.clear(["OVERVIEW"]) == 1
+    assert cache.get(overview("IBM")) is None
+    assert cache.get({"function": "TIME_SERIES_DAILY", "symbol": "IBM"}) == b"{}2"
+    assert cache.clear() == 1
+
+
+def test_cached_requests_need_no_api_key(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # no .env to load the key from
+    monkeypatch.delenv("ALPHA_VANTAGE_API_KEY", raising=False)
+    monkeypatch.delenv(BASE_URL_ENV, raising=False)
+    response_cache = cache_module.configure(tmp_path / "responses.sqlite")
+    try:
+        response_cache.put({"function": "OVERVIEW", "symbol": "IBM"}, b'{"Symbol": "IBM"}')
+        assert AV.OverviewRequest(symbol="IBM").query().json() == {"Symbol": "IBM"}
+    finally:
+        cache_module.configure(None)
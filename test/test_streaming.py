@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import torch
+
+from src.stock_solver.benchmarks.suite import synthetic_data
+from src.stock_solver.dataset.dataset import MultiTickerDataset
+from src.stock_solver.model.model import StockSolver
+from src.stock_solver.model.streaming import StreamingPredictor, date_marks, trading_holidays
+
+MLK_DAY = pd.Timestamp("2018-01-15")
+PRESIDENTS_DAY = pd.Timestamp("2018-02-19")
+
+
+def dataset_until(end: str) -> MultiTickerDataset:
+    data = {ticker: df.drop([MLK_DAY, PRESIDENTS_DAY]).loc[:end] for ticker, df in synthetic_data(3, 60).items()}
+    return MultiTickerDataset(data, lookback=8, horizon=3, is_test=True)
+
+
+def test_trading_holidays_are_the_weekdays_nothing_traded():
+    calendar = pd.bdate_range("2018-01-08", "2018-01-19").drop(MLK_DAY).values
+    assert trading_holidays(calendar).tolist() == [MLK_DAY.date()]
+    assert len(trading_holidays(np.empty(0, "datetime64[ns]"))) == 0
+
+
+def test_decoder_marks_skip_holidays():
+    dataset = dataset_until("2018-02-16")
+    predictor = StreamingPredictor.from_dataset(torch.nn.Identity(), dataset, holidays=np.array([PRESIDENTS_DAY.date()]))
+    assert MLK_DAY.date() in predictor.calendar.holidays.tolist()
+
+    expected = pd.DatetimeIndex(["2018-02-20", "2018-02-21", "2018-02-22"]).values
+    marks = predictor.decoder_marks(np.arange(len(dataset.tickers)))
+    assert (marks == date_marks(expected)).all()
+
+
+def replayed_data():
+    """Three tickers without the two holidays, one listed late and one missing a day during the replay."""
+    data = {ticker: df.drop([MLK_DAY, PRESIDENTS_DAY]) for ticker, df in synthetic_data(3, 60).items()}
+    data["T0001"] = data["T0001"].loc["2018-02-12":]
+    data["T0002"] = data["T0002"].drop(pd.Timestamp("2018-02-27"))
+    return data
+
+
+def test_streamed_windows_and_forecasts_match_the_dataset():
+    data, lookback, horizon = replayed_data(), 8, 3
+    # every window of the replay, including the ones forecasting past its end, is in the full dataset
+    dataset = MultiTickerDataset(data, lookback=lookback, horizon=horizon, is_test=True)
+    calendar = pd.DatetimeIndex(np.unique(np.concatenate([df.index.values for df in data.values()])))
+    replay = calendar[calendar >= pd.Timestamp("2018-02-15")][:-horizon - 1]
+    history = {ticker: df[df.index < replay[0]] for ticker, df in data.items()}
+
+    torch.manual_seed(0)
+    model = StockSolver(
+        enc_in=5, dec_in=5, model_dim=16, output_dim=1, num_tickers=len(data), dropout=0.0,
+        max_seq_len=lookback, heads=2, hidden_dim=32,
+    ).eval()
+    holidays = np.array([PRESIDENTS_DAY.date()])
+    history_dataset = MultiTickerDataset(history, lookback=lookback, horizon=horizon, is_test=True)
+    predictor = StreamingPredictor.from_dataset(model, history_dataset, holidays=holidays)
+    warm = np.array([len(df) for df in history.values()])
+    assert predictor.buffer.count.tolist() == warm.tolist() and 0 < warm[1] < lookback
+
+    items = {
+        (window.ticker_id, dataset.dates[window.ticker_id][window.start + lookback - 1]): dataset[i]
+        for i, window in enumerate(dataset.win)
+    }
+    scored = 0
+    for day in replay:
+        bars = {ticker: df.loc[day, dataset.feature_cols] for ticker, df in data.items() if day in df.index}
+        features = np.stack([row.to_numpy(dtype=np.float32) for row in bars.values()])
+        predictor.ingest(list(bars), np.full(len(bars), day.to_datetime64()), features)
+        tickers, forecasts = predictor.step()
+        # only the tickers with a bar today and a full window are scored
+        assert tickers == [t for t in bars if len(data[t].loc[:day]) >= lookback]
+        if not tickers:
+            continue
+        ticker_ids = np.array([predictor.ticker_ids[t] for t in tickers])
+        x, enc_marks = predictor.buffer.windows(ticker_ids)
+        expected = [items[ticker_id, day] for ticker_id in ticker_ids]
+        dataset_x = torch.stack([item[0][0] for item in expected])
+        dataset_enc_marks = torch.stack([item[0][1] for item in expected])
+        assert (x == dataset_x.numpy()).all() and (enc_marks == dataset_enc_marks.numpy()).all()
+        # the next trading days of the exchange, a ticker suspended on one of them has other dataset marks
+        following = date_marks(calendar[calendar.searchsorted(day) + 1:][:horizon].values)
+        dec_marks = predictor.decoder_marks(ticker_ids)
+        assert (dec_marks == following).all()
+        suspended = pd.Timestamp("2018-02-22") <= day < pd.Timestamp("2018-02-27")
+        for ticker_id, item in zip(ticker_ids, expected):
+            if not (ticker_id == 2 and suspended):
+                assert (item[1].numpy() == following).all()
+        with torch.inference_mode():
+            out = model(dataset_x, dataset_enc_marks, torch.from_numpy(dec_marks), torch.from_numpy(ticker_ids))
+        torch.testing.assert_close(torch.from_numpy(forecasts), out[..., 0])
+        scored += len(tickers)
+
+    # the ring buffer wrapped around at least twice for every ticker
+    assert (predictor.buffer.count - warm > 2 * lookback).all() and scored > 0